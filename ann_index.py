@@ -0,0 +1,343 @@
+import json
+import os
+
+import numpy as np
+
+
+class HNSWIndex:
+    """HNSW graph index over normalized vectors, backed by hnswlib.
+
+    ``ef`` trades recall for latency at query time; ``M`` and
+    ``ef_construction`` do the same at build time.
+    """
+
+    def __init__(self, dim, M=16, ef_construction=200, ef=64, capacity=1024):
+        import hnswlib  # Optional dependency, only needed for this index type
+
+        self.dim = dim
+        self.params = {"M": M, "ef_construction": ef_construction, "ef": ef}
+        self.index = hnswlib.Index(space="ip", dim=dim)
+        self.index.init_index(max_elements=capacity, M=M, ef_construction=ef_construction)
+        self.index.set_ef(ef)
+        self.labels = {}  # id -> int label
+        self.ids = {}  # int label -> id
+        self.next_label = 0
+
+    def __len__(self):
+        return len(self.labels)
+
+    def keys(self):
+        return list(self.labels)
+
+    def set_ef(self, ef):
+        self.params["ef"] = ef
+        self.index.set_ef(ef)
+
+    def add(self, ids, vectors):
+        self.remove([id for id in ids if id in self.labels])
+        needed = self.next_label + len(ids)
+        if needed > self.index.get_max_elements():
+            self.index.resize_index(max(needed, 2 * self.index.get_max_elements()))
+        labels = np.arange(self.next_label, needed)
+        self.index.add_items(np.asarray(vectors, dtype=np.float32), labels)
+        for id, label in zip(ids, labels.tolist()):
+            self.labels[id] = label
+            self.ids[label] = id
+        self.next_label = needed
+
+    def remove(self, ids):
+        for id in ids:
+            label = self.labels.pop(id, None)
+            if label is not None:
+                self.index.mark_deleted(label)
+                del self.ids[label]
+
+    def search(self, vector, top_k):
+        top_k = min(top_k, len(self.labels))
+        if top_k <= 0:
+            return []
+        labels, distances = self.index.knn_query(
+            np.asarray(vector, dtype=np.float32), k=top_k
+        )
+        # hnswlib's "ip" distance is 1 - inner product
+        return [
+            (self.ids[label], 1.0 - float(distance))
+            for label, distance in zip(labels[0].tolist(), distances[0].tolist())
+        ]
+
+    def save(self, prefix):
+        self.index.save_index(f"{prefix}.hnsw")
+        with open(f"{prefix}.hnsw.json", "w") as f:
+            json.dump(
+                {"params": self.params, "labels": self.labels, "next": self.next_label}, f
+            )
+
+    @classmethod
+    def load(cls, prefix, dim):
+        import hnswlib
+
+        with open(f"{prefix}.hnsw.json") as f:
+            state = json.load(f)
+        self = cls.__new__(cls)
+        self.dim = dim
+        self.params = state["params"]
+        self.index = hnswlib.Index(space="ip", dim=dim)
+        self.index.load_index(f"{prefix}.hnsw")
+        self.index.set_ef(self.params["ef"])
+        self.labels = state["labels"]
+        self.ids = {label: id for id, label in self.labels.items()}
+        self.next_label = state["next"]
+        return self
+
+
+def _kmeans(vectors, k, iterations=10, seed=0):
+    """Spherical k-means; returns unit-length centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        filled = np.bincount(assignment, minlength=k) > 0
+        centroids[filled] = sums[filled]  # Empty clusters keep their old centroid
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True)
+    return centroids
+
+
+def _nearest(part, codebook, chunk=8192):
+    """Index of the nearest codeword for each row, by ||c||^2 - 2 x.c in chunks."""
+    codeword_norms = (codebook**2).sum(axis=1)
+    assignment = np.empty(len(part), dtype=np.int64)
+    for start in range(0, len(part), chunk):
+        block = part[start : start + chunk]
+        assignment[start : start + chunk] = np.argmin(
+            codeword_norms - 2 * block @ codebook.T, axis=1
+        )
+    return assignment
+
+
+def _pq_codebook(part, k=256, sample=65536):
+    """k-means (Euclidean) codebook for one PQ subspace, trained on a sample."""
+    rng = np.random.default_rng(0)
+    if len(part) > sample:
+        part = part[rng.choice(len(part), size=sample, replace=False)]
+    k = min(k, len(part))
+    codebook = part[rng.choice(len(part), size=k, replace=False)].copy()
+    for _ in range(10):
+        assignment = _nearest(part, codebook)
+        sums = np.zeros_like(codebook)
+        np.add.at(sums, assignment, part)
+        counts = np.bincount(assignment, minlength=k)
+        filled = counts > 0
+        codebook[filled] = sums[filled] / counts[filled, None]
+    return codebook
+
+
+class InvertedList:
+    """Contiguous rows for one IVF list; removal swaps the last row into the gap."""
+
+    def __init__(self, width, dtype):
+        self.ids = []
+        self.positions = {}  # id -> row
+        self.data = np.empty((16, width), dtype=dtype)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, id, value):
+        if len(self.ids) == len(self.data):
+            grown = np.empty((2 * len(self.data), self.data.shape[1]), self.data.dtype)
+            grown[: len(self.data)] = self.data
+            self.data = grown
+        self.positions[id] = len(self.ids)
+        self.data[len(self.ids)] = value
+        self.ids.append(id)
+
+    def remove(self, id):
+        row = self.positions.pop(id)
+        last = self.ids.pop()
+        if last != id:
+            self.data[row] = self.data[len(self.ids)]
+            self.ids[row] = last
+            self.positions[last] = row
+
+    def rows(self):
+        return self.data[: len(self.ids)]
+
+
+class IVFIndex:
+    """Inverted-file index in NumPy, optionally storing product-quantized residuals.
+
+    Vectors are assigned to the nearest of ``nlist`` k-means centroids; a query
+    scans the ``nprobe`` closest lists, so nprobe trades recall for latency.
+    With ``pq_m`` set, each vector is stored as pq_m one-byte codes of its
+    residual from the centroid instead of dim floats, and scored with per-query
+    lookup tables. The quantizers are trained once ``train_size`` vectors have
+    been added; until then every vector sits in one list and search is exact.
+    Collections smaller than the default 40 * nlist should pass a smaller
+    train_size (at least nlist).
+    """
+
+    def __init__(self, dim, nlist=256, nprobe=8, pq_m=None, train_size=None):
+        if pq_m is not None and dim % pq_m:
+            raise ValueError(f"pq_m={pq_m} must divide the dimension {dim}")
+        if train_size is not None and train_size < nlist:
+            raise ValueError(f"train_size={train_size} must be at least nlist={nlist}")
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.train_size = train_size or 40 * nlist
+        self.centroids = None
+        self.codebooks = None  # (pq_m, 256, dim / pq_m)
+        self.lists = [InvertedList(dim, np.float32)]
+        self.where = {}  # id -> list number
+
+    def __len__(self):
+        return len(self.where)
+
+    def keys(self):
+        return list(self.where)
+
+    def _train(self):
+        ids = [id for lst in self.lists for id in lst.ids]
+        vectors = np.concatenate([lst.rows() for lst in self.lists])
+        self.centroids = _kmeans(vectors, self.nlist)
+        if self.pq_m:
+            assignment = np.argmax(vectors @ self.centroids.T, axis=1)
+            residuals = vectors - self.centroids[assignment]
+            sub = self.dim // self.pq_m
+            self.codebooks = np.stack(
+                [
+                    _pq_codebook(residuals[:, m * sub : (m + 1) * sub])
+                    for m in range(self.pq_m)
+                ]
+            )
+        width, dtype = (self.pq_m, np.uint8) if self.pq_m else (self.dim, np.float32)
+        self.lists = [InvertedList(width, dtype) for _ in range(self.nlist)]
+        self.where = {}
+        self._insert(ids, vectors)
+
+    def _encode(self, vectors, assignment):
+        if self.codebooks is None:
+            return vectors
+        residuals = vectors - self.centroids[assignment]
+        sub = self.dim // self.pq_m
+        codes = np.empty((len(vectors), self.pq_m), dtype=np.uint8)
+        for m in range(self.pq_m):
+            codes[:, m] = _nearest(
+                residuals[:, m * sub : (m + 1) * sub], self.codebooks[m]
+            )
+        return codes
+
+    def _insert(self, ids, vectors):
+        if self.centroids is None:
+            assignment = np.zeros(len(ids), dtype=int)
+        else:
+            assignment = np.argmax(vectors @ self.centroids.T, axis=1)
+        encoded = self._encode(vectors, assignment)
+        for id, lst, value in zip(ids, assignment.tolist(), encoded):
+            self.lists[lst].append(id, value)
+            self.where[id] = lst
+
+    def add(self, ids, vectors):
+        self.remove([id for id in ids if id in self.where])
+        self._insert(ids, np.asarray(vectors, dtype=np.float32))
+        if self.centroids is None and len(self.where) >= self.train_size:
+            self._train()
+
+    def remove(self, ids):
+        for id in ids:
+            lst = self.where.pop(id, None)
+            if lst is not None:
+                self.lists[lst].remove(id)
+
+    def search(self, vector, top_k):
+        vector = np.asarray(vector, dtype=np.float32)
+        if self.centroids is None:
+            probes = [0]
+        else:
+            centroid_scores = self.centroids @ vector
+            probes = np.argsort(-centroid_scores)[: self.nprobe].tolist()
+        if self.codebooks is not None:
+            sub = self.dim // self.pq_m
+            tables = np.einsum(
+                "mkd,md->mk", self.codebooks, vector.reshape(self.pq_m, sub)
+            )
+        ids, scores = [], []
+        for lst in probes:
+            inverted = self.lists[lst]
+            if not len(inverted):
+                continue
+            ids.extend(inverted.ids)
+            if self.codebooks is None:
+                scores.append(inverted.rows() @ vector)
+            else:
+                codes = inverted.rows()
+                residual = tables[np.arange(self.pq_m), codes].sum(axis=1)
+                scores.append(centroid_scores[lst] + residual)
+        if not ids:
+            return []
+        scores = np.concatenate(scores)
+        top_k = min(top_k, len(ids))
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        return [(ids[i], float(scores[i])) for i in top]
+
+    def save(self, prefix):
+        ids = [id for lst in self.lists for id in lst.ids]
+        np.savez(
+            f"{prefix}.ivf.npz",
+            sizes=np.array([len(lst) for lst in self.lists], dtype=np.int64),
+            values=np.concatenate([lst.rows() for lst in self.lists]),
+            centroids=self.centroids if self.centroids is not None else np.zeros(0),
+            codebooks=self.codebooks if self.codebooks is not None else np.zeros(0),
+        )
+        with open(f"{prefix}.ivf.json", "w") as f:
+            json.dump(
+                {
+                    "ids": ids,
+                    "nlist": self.nlist,
+                    "nprobe": self.nprobe,
+                    "pq_m": self.pq_m,
+                    "train_size": self.train_size,
+                },
+                f,
+            )
+
+    @classmethod
+    def load(cls, prefix, dim):
+        with open(f"{prefix}.ivf.json") as f:
+            state = json.load(f)
+        arrays = np.load(f"{prefix}.ivf.npz")
+        self = cls(dim, state["nlist"], state["nprobe"], state["pq_m"], state["train_size"])
+        values = arrays["values"]
+        if arrays["centroids"].size:
+            self.centroids = arrays["centroids"]
+            if arrays["codebooks"].size:
+                self.codebooks = arrays["codebooks"]
+            self.lists = [InvertedList(values.shape[1], values.dtype) for _ in range(self.nlist)]
+        start = 0
+        for lst, size in enumerate(arrays["sizes"].tolist()):
+            for id, value in zip(state["ids"][start : start + size], values[start : start + size]):
+                self.lists[lst].append(id, value)
+                self.where[id] = lst
+            start += size
+        return self
+
+
+INDEX_TYPES = {"hnsw": HNSWIndex, "ivf": IVFIndex}
+
+
+def build_index(options, dim):
+    """Creates an index from {"type": "hnsw" | "ivf", **params}."""
+    params = dict(options)
+    return INDEX_TYPES[params.pop("type")](dim, **params)
+
+
+def load_index(options, prefix, dim):
+    index_cls = INDEX_TYPES[options["type"]]
+    suffix = ".hnsw.json" if index_cls is HNSWIndex else ".ivf.json"
+    if os.path.exists(prefix + suffix):
+        return index_cls.load(prefix, dim)
+    return None
@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """Answers to past questions, matched by embedding similarity.
+
+    Entries are scoped to a document key (the version of the patient's
+    documents), so a changed PDF never serves stale answers; invalidate()
+    drops them eagerly. Entries expire after ttl seconds and the least
+    recently used go first once there are more than max_entries.
+    """
+
+    def __init__(self, embeddings, threshold=0.95, ttl=24 * 3600, max_entries=1000):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # id -> entry, least recently used first
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.latency_saved = 0.0
+
+    def _embed(self, question):
+        vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _expire(self, now):
+        for id in [id for id, e in self._entries.items() if now - e["created"] > self.ttl]:
+            del self._entries[id]
+
+    def lookup(self, question, doc_key):
+        """Returns the cached entry for the closest past question, or None."""
+        vector = self._embed(question)
+        with self._lock:
+            self.lookups += 1
+            self._expire(time.time())
+            candidates = [(id, e) for id, e in self._entries.items() if e["doc"] == doc_key]
+            if not candidates:
+                return None
+            scores = np.stack([e["vector"] for _, e in candidates]) @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            id, entry = candidates[best]
+            self._entries.move_to_end(id)
+            self.hits += 1
+            self.latency_saved += entry["latency"]
+            return {**entry, "similarity": float(scores[best])}
+
+    def put(self, question, doc_key, answer, sources, latency):
+        vector = self._embed(question)
+        with self._lock:
+            self._entries[self._next_id] = {
+                "question": question,
+                "doc": doc_key,
+                "vector": vector,
+                "answer": answer,
+                "sources": sources,
+                "latency": latency,
+                "created": time.time(),
+            }
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, doc_key=None):
+        """Drops the entries for doc_key, or everything."""
+        with self._lock:
+            for id in [
+                id for id, e in self._entries.items() if doc_key in (None, e["doc"])
+            ]:
+                del self._entries[id]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+                "latency_saved_s": round(self.latency_saved, 2),
+            }
@@ -0,0 +1,107 @@
+"""Compares ANN indexes with the brute-force scan on synthetic clustered vectors.
+
+Usage: python bench_ann.py [num_vectors] [dim]
+"""
+import sys
+import time
+
+import numpy as np
+
+from ann_index import HNSWIndex, IVFIndex
+
+
+def synthetic_vectors(n, dim, clusters=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, n)]
+    vectors += 0.4 * rng.normal(size=(n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def brute_force(vectors, query, k):
+    scores = vectors @ query
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def rerank(vectors, query, candidates, k):
+    """Exact rescoring of index candidates, as MmapVectorStorage.search does."""
+    rows = [int(id) for id, _ in candidates]
+    exact = vectors[rows] @ query
+    return [rows[i] for i in np.argsort(-exact)[:k]]
+
+
+def run(name, search, queries, truth, k):
+    start = time.perf_counter()
+    found = [search(q) for q in queries]
+    latency_ms = (time.perf_counter() - start) / len(queries) * 1000
+    recall = np.mean([len(set(f) & set(t.tolist())) / k for f, t in zip(found, truth)])
+    print(f"{name:<28} recall@{k}={recall:.3f}  {latency_ms:8.3f} ms/query")
+
+
+def main(n=100_000, dim=128, num_queries=200, k=10):
+    print(f"{n} vectors, dim {dim}, {num_queries} queries")
+    vectors = synthetic_vectors(n, dim)
+    queries = synthetic_vectors(num_queries, dim, seed=1)
+    ids = [str(i) for i in range(n)]
+
+    truth = [brute_force(vectors, q, k) for q in queries]
+    run("brute force", lambda q: brute_force(vectors, q, k).tolist(), queries, truth, k)
+
+    nlist = int(4 * np.sqrt(n))
+    # Train once every vector is in, even when n is below the default 40 * nlist
+    train_size = min(n, 40 * nlist)
+    for pq_m in (None, dim // 8):
+        start = time.perf_counter()
+        index = IVFIndex(dim, nlist=nlist, pq_m=pq_m, train_size=train_size)
+        for s in range(0, n, 10_000):  # Incremental adds, as segments arrive
+            index.add(ids[s : s + 10_000], vectors[s : s + 10_000])
+        if index.centroids is None:
+            raise RuntimeError("IVF index never trained; results would be a flat scan")
+        label = "ivf" if pq_m is None else f"ivf-pq{pq_m}"
+        print(f"{label} build: {time.perf_counter() - start:.1f}s")
+        for nprobe in (4, 16, 64):
+            index.nprobe = nprobe
+            run(
+                f"{label} nprobe={nprobe}",
+                lambda q: [int(id) for id, _ in index.search(q, k)],
+                queries,
+                truth,
+                k,
+            )
+            if pq_m is None:
+                continue
+            # PQ scores are approximate; MmapVectorStorage rescores rerank * k candidates exactly
+            for factor in (4, 16):
+                run(
+                    f"{label} nprobe={nprobe} rerank={factor}",
+                    lambda q: rerank(vectors, q, index.search(q, k * factor), k),
+                    queries,
+                    truth,
+                    k,
+                )
+
+    try:
+        start = time.perf_counter()
+        index = HNSWIndex(dim, capacity=n)
+        for s in range(0, n, 10_000):
+            index.add(ids[s : s + 10_000], vectors[s : s + 10_000])
+        print(f"hnsw build: {time.perf_counter() - start:.1f}s")
+    except ImportError:
+        print("hnswlib not installed, skipping HNSW")
+        return
+    for ef in (16, 64, 256):
+        index.set_ef(ef)
+        run(
+            f"hnsw ef={ef}",
+            lambda q: [int(id) for id, _ in index.search(q, k)],
+            queries,
+            truth,
+            k,
+        )
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    main(*args)
@@ -0,0 +1,210 @@
+import hashlib
+import itertools
+import json
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import faiss
+import numpy as np
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(source, text):
+    return hashlib.sha1(f"{source}\0{text}".encode()).hexdigest()
+
+
+class EHRIndex:
+    """FAISS knowledge base for EHR documents, persisted and sharded by patient.
+
+    Layout under index_dir:
+      manifest.json                  document hash -> patient, source, chunk count
+      shards/{patient}/index.faiss   flat L2 index, memory-mapped when loaded
+      shards/{patient}/chunks.jsonl  one line per index row: text and metadata
+
+    A document whose hash is in the manifest is never read again. When a
+    source changes, only chunks its patient's shard does not hold yet are
+    embedded and added, and rows for chunks that disappeared are removed.
+    """
+
+    def __init__(self, index_dir, embeddings):
+        self.index_dir = index_dir
+        self.embeddings = embeddings
+        self._manifest_file = os.path.join(index_dir, "manifest.json")
+        self.manifest = {"documents": {}}
+        if os.path.exists(self._manifest_file):
+            with open(self._manifest_file) as f:
+                self.manifest = json.load(f)
+        self._shards = {}  # patient -> (faiss index, chunk dicts), loaded on demand
+        self._writable = set()
+
+    def _shard_dir(self, patient):
+        return os.path.join(self.index_dir, "shards", patient)
+
+    def patients(self):
+        return sorted({d["patient"] for d in self.manifest["documents"].values()})
+
+    def version(self, patient):
+        """Changes whenever any of the patient's documents changes."""
+        documents = self.manifest["documents"]
+        hashes = sorted(h for h, d in documents.items() if d["patient"] == patient)
+        return hashlib.sha1("".join(hashes).encode()).hexdigest()
+
+    def has_document(self, doc_hash):
+        return doc_hash in self.manifest["documents"]
+
+    def _load(self, patient, writable=False):
+        if patient in self._shards and (not writable or patient in self._writable):
+            return self._shards[patient]
+        shard_dir = self._shard_dir(patient)
+        index_file = os.path.join(shard_dir, "index.faiss")
+        if not os.path.exists(index_file):
+            shard = (None, [])
+        else:
+            if writable:
+                index = faiss.read_index(index_file)
+            else:
+                try:
+                    index = faiss.read_index(
+                        index_file, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+                    )
+                except RuntimeError:  # Older faiss builds can't mmap flat indexes
+                    index = faiss.read_index(index_file)
+            with open(os.path.join(shard_dir, "chunks.jsonl")) as f:
+                shard = (index, [json.loads(line) for line in f])
+        self._shards[patient] = shard
+        if writable:
+            self._writable.add(patient)
+        return shard
+
+    def _save(self, patient, index, chunks):
+        shard_dir = self._shard_dir(patient)
+        os.makedirs(shard_dir, exist_ok=True)
+        # Write to temporary files and swap, so a crash never leaves a torn shard
+        faiss.write_index(index, os.path.join(shard_dir, "index.faiss.tmp"))
+        with open(os.path.join(shard_dir, "chunks.jsonl.tmp"), "w") as f:
+            for chunk in chunks:
+                f.write(json.dumps(chunk) + "\n")
+        for name in ("index.faiss", "chunks.jsonl"):
+            path = os.path.join(shard_dir, name)
+            os.replace(path + ".tmp", path)
+        with open(self._manifest_file + ".tmp", "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(self._manifest_file + ".tmp", self._manifest_file)
+
+    def add_document(self, source, doc_hash, patient, page_chunks, batch_size=64):
+        """Indexes (page number, text) pairs for source; returns the number of new chunks.
+
+        page_chunks may be a generator: new chunks are embedded in batches on
+        a background thread while the next pages are still being produced.
+        """
+        index, stored = self._load(patient, writable=True)
+        known = {chunk["id"]: chunk for chunk in stored}
+        seen = set()
+        batch, pending, new_count = [], deque(), 0
+
+        def add_batches(wait):
+            nonlocal index, stored
+            while pending and (wait or pending[0][1].done()):
+                chunks, future = pending.popleft()
+                vectors = np.array(future.result(), dtype=np.float32)
+                if index is None:
+                    index = faiss.IndexFlatL2(vectors.shape[1])
+                index.add(vectors)
+                stored = stored + chunks
+
+        with ThreadPoolExecutor(max_workers=1) as embedder:
+            for page, text in itertools.chain(page_chunks, [(None, None)]):
+                if text is not None:
+                    id = chunk_id(source, text)
+                    if id in seen:
+                        continue
+                    seen.add(id)
+                    if id in known:
+                        # Pages may have shifted
+                        known[id].update(page=page, doc=doc_hash)
+                        continue
+                    batch.append(
+                        {
+                            "id": id,
+                            "source": source,
+                            "patient": patient,
+                            "doc": doc_hash,
+                            "page": page,
+                            "text": text,
+                        }
+                    )
+                if batch and (text is None or len(batch) >= batch_size):
+                    texts = [chunk["text"] for chunk in batch]
+                    future = embedder.submit(self.embeddings.embed_documents, texts)
+                    pending.append((batch, future))
+                    new_count += len(batch)
+                    batch = []
+                add_batches(wait=False)
+            add_batches(wait=True)
+
+        # Rows from an older version of this source that are gone now
+        stale = [
+            row
+            for row, chunk in enumerate(stored)
+            if chunk["source"] == source and chunk["id"] not in seen
+        ]
+        if stale:
+            index.remove_ids(np.array(stale, dtype=np.int64))
+            stale = set(stale)
+            stored = [chunk for row, chunk in enumerate(stored) if row not in stale]
+
+        documents = self.manifest["documents"]
+        for old_hash in [h for h, d in documents.items() if d["source"] == source]:
+            del documents[old_hash]
+        documents[doc_hash] = {"patient": patient, "source": source, "chunks": len(seen)}
+        if index is not None:
+            self._save(patient, index, stored)
+        self._shards[patient] = (index, stored)
+        return new_count
+
+    def vectorstore(self, patient):
+        """LangChain FAISS store over one patient's shard."""
+        from langchain.docstore.document import Document
+        from langchain.docstore.in_memory import InMemoryDocstore
+        from langchain.vectorstores import FAISS
+
+        index, chunks = self._load(patient)
+        if index is None:
+            raise KeyError(f"No documents indexed for patient {patient!r}")
+        docstore = InMemoryDocstore(
+            {
+                str(row): Document(
+                    page_content=chunk["text"],
+                    metadata={k: v for k, v in chunk.items() if k != "text"},
+                )
+                for row, chunk in enumerate(chunks)
+            }
+        )
+        return FAISS(
+            self.embeddings.embed_query,
+            index,
+            docstore,
+            {row: str(row) for row in range(len(chunks))},
+        )
+
+    def search(self, query, k=4, patients=None):
+        """Top k (distance, chunk) pairs across the given patients' shards (default all)."""
+        vector = np.array([self.embeddings.embed_query(query)], dtype=np.float32)
+        results = []
+        for patient in patients or self.patients():
+            index, chunks = self._load(patient)
+            if index is None or not index.ntotal:
+                continue
+            distances, rows = index.search(vector, min(k, index.ntotal))
+            results.extend(
+                (float(d), chunks[row]) for d, row in zip(distances[0], rows[0]) if row >= 0
+            )
+        return sorted(results, key=lambda result: result[0])[:k]
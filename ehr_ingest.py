@@ -0,0 +1,65 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from PyPDF2 import PdfReader
+
+_reader = None  # One parsed PDF per worker process
+
+
+def _open(pdf_path):
+    global _reader
+    _reader = PdfReader(pdf_path)
+
+
+def _extract(page_number):
+    return page_number, _reader.pages[page_number - 1].extract_text() or ""
+
+
+def iter_pages(pdf_path, workers=None, window=None):
+    """Yields (page number, text) in order, extracting pages in a process pool.
+
+    At most window pages are in flight, so memory does not grow with the
+    document, and the first pages are available while later ones are still
+    being extracted. Under spawn or forkserver each worker re-imports the
+    calling script, so its setup has to sit behind a __main__ guard.
+    """
+    num_pages = len(PdfReader(pdf_path).pages)
+    workers = workers or min(os.cpu_count() or 1, 8)
+    window = window or 4 * workers
+    with ProcessPoolExecutor(workers, initializer=_open, initargs=(pdf_path,)) as pool:
+        pending = deque()
+        next_page = 1
+        while pending or next_page <= num_pages:
+            while next_page <= num_pages and len(pending) < window:
+                pending.append(pool.submit(_extract, next_page))
+                next_page += 1
+            yield pending.popleft().result()
+
+
+class IngestStats:
+    def __init__(self):
+        self.pages = 0
+        self.chunks = 0
+        self.start = time.perf_counter()
+
+    def report(self):
+        seconds = time.perf_counter() - self.start
+        return {
+            "pages": self.pages,
+            "chunks": self.chunks,
+            "seconds": round(seconds, 2),
+            "pages_per_sec": round(self.pages / seconds, 1) if seconds else 0.0,
+        }
+
+
+def iter_page_chunks(pdf_path, text_splitter, stats=None, workers=None):
+    """Yields (page number, chunk) as each page is extracted and split."""
+    for page_number, text in iter_pages(pdf_path, workers):
+        chunks = text_splitter.split_text(text)
+        if stats is not None:
+            stats.pages += 1
+            stats.chunks += len(chunks)
+        for chunk in chunks:
+            yield page_number, chunk
@@ -1,142 +1,143 @@
 from dotenv import load_dotenv
 import gradio as gr
-from PyPDF2 import PdfReader
 from langchain.text_splitter import CharacterTextSplitter
 from langchain.embeddings import OpenAIEmbeddings
-from langchain.vectorstores import FAISS
-from langchain.chains import ConversationalRetrievalChain
-from langchain.chat_models import ChatOpenAI
-from langchain.callbacks import get_openai_callback
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+from ehr_index import EHRIndex, file_hash
+from ehr_ingest import IngestStats, iter_page_chunks
+from ehr_session import EHRSession
+from answer_cache import SemanticAnswerCache
+import os
 
 load_dotenv()
 
+CACHE_DIR = "ehr_index"
 
-# Pre-process the PDF and create the knowledge base
-def create_knowledge_base(pdf_path):
-    with open(pdf_path, "rb") as f:
-        pdf_reader = PdfReader(f)
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text()
 
-    # Chunking
-    text_splitter = CharacterTextSplitter(
-        separator="\n", chunk_size=1000, chunk_overlap=200
+def load_index(cache_dir=CACHE_DIR):
+    """Returns the persisted EHR index and the answer cache shared by every session."""
+    # Embeddings, cached by content so re-loading an unchanged PDF makes no calls
+    os.makedirs(cache_dir, exist_ok=True)
+    embeddings = CachedEmbeddings(
+        OpenAIEmbeddings(), EmbeddingCache(os.path.join(cache_dir, "embeddings.sqlite"))
     )
-    chunks = text_splitter.split_text(text)
-
-    # Embeddings
-    embeddings = OpenAIEmbeddings()
-    knowledge_base = FAISS.from_texts(chunks, embeddings)
+    # Answers are scoped to the patient's document version
+    return EHRIndex(cache_dir, embeddings), SemanticAnswerCache(embeddings)
+
+
+# Pre-process the PDF and add it to the persisted knowledge base
+def create_knowledge_base(ehr_index, answer_cache, pdf_path, patient=None):
+    patient = patient or os.path.splitext(os.path.basename(pdf_path))[0]
+    doc_hash = file_hash(pdf_path)
+    if not ehr_index.has_document(doc_hash):  # Unchanged PDFs are not read again
+        answer_cache.invalidate(ehr_index.version(patient))
+        text_splitter = CharacterTextSplitter(
+            separator="\n", chunk_size=1000, chunk_overlap=200
+        )
+        # Pages are extracted in a process pool and chunked as they arrive, while
+        # new chunks are embedded in the background
+        stats = IngestStats()
+        ehr_index.add_document(
+            pdf_path, doc_hash, patient, iter_page_chunks(pdf_path, text_splitter, stats)
+        )
+        print(f"Ingested {pdf_path}: {stats.report()}")
 
-    return knowledge_base
+    return ehr_index.vectorstore(patient)
 
 
-# Load the knowledge base once at the start
-knowledge_base = create_knowledge_base("patient.pdf")
+PATIENT = "patient"
 
 
-# Function to handle user questions
-def question_answer(question, chat_history):
+# Function to handle user questions, streaming the answer as it is generated
+def question_answer(question, session):
     if not question.strip():
-        return chat_history  # Return the chat_history string
-
-    retriever = knowledge_base.as_retriever()
-
-    # Initialize ChatOpenAI with the desired model
-    llm = ChatOpenAI(model_name="gpt-4", temperature=0)
+        return
+    yield from session.ask(question)
 
-    # Create a ConversationalRetrievalChain
-    qa_chain = ConversationalRetrievalChain.from_llm(llm, retriever=retriever)
 
-    # Parse existing chat history
-    history = []
-    if chat_history:
-        entries = chat_history.strip().split("\n\n")
-        for entry in entries:
-            lines = entry.strip().split("\n")
-            if len(lines) >= 2:
-                user_input = lines[0].replace("Surgeon: ", "").strip()
-                assistant_response = lines[1].replace("Response: ", "").strip()
-                history.append((user_input, assistant_response))
-
-    with get_openai_callback() as cb:
-        result = qa_chain({"question": question, "chat_history": history})
-        response = result["answer"]
-
-    chat_history += f"Surgeon: {question}\nResponse: {response}\n\n"
-    return chat_history  # Return the updated chat history string
-
-
-# Build the Gradio app
 # Build the Gradio app
-with gr.Blocks(
-    css="""
-    .container {max-width: 800px; margin: auto;}
-    .title {text-align: center; font-size: 2em; font-weight: bold; margin-bottom: 10px;}
-    .subtitle {text-align: center; font-size: 1em; color: gray; margin-bottom: 20px;}
-    #chatbox {height: 400px; overflow-y: auto; background-color: #000000; padding: 10px; border-radius: 5px;}
-    #chatbox p {margin: 0 0 10px;}
-    #chatbox .surgeon {color: #1f77b4; font-weight: bold;}
-    #chatbox .response {color: #ff7f0e;}
-    .input-row {display: flex; align-items: center; margin-top: 10px;}
-    .input-row .wrap {flex-grow: 1;}
-    .input-row textarea {width: 100%; resize: none;}
-    .input-row button {margin-left: 10px;}
-"""
-) as demo:
-    with gr.Column(elem_classes="container"):
-        gr.Markdown(
-            """
-            <div class="title">🏥 EHR Querying</div>
-            <div class="subtitle">Query EHR for potential complications</div>
-            """
-        )
-
-        output = gr.HTML(
-            label="Conversation",
-            elem_id="chatbox",
-        )
-
-        with gr.Row(elem_classes="input-row"):
-            with gr.Column(elem_classes="wrap"):
-                question = gr.Textbox(
-                    show_label=False,
-                    placeholder="Type your question here...",
-                    lines=1,
-                    max_lines=1,
-                )
-            btn = gr.Button("Send", variant="primary")
-
-    def format_chat_history(chat_history):
-        formatted = ""
-        if chat_history:
-            entries = chat_history.strip().split("\n\n")
-            for entry in entries:
-                lines = entry.strip().split("\n")
-                if len(lines) >= 2:
-                    user_line = lines[0].replace("Surgeon: ", "").strip()
-                    response_line = lines[1].replace("Response: ", "").strip()
-                    formatted += (
-                        f"<p><span class='surgeon'>Surgeon:</span> {user_line}</p>"
+def build_demo(ehr_index, answer_cache, knowledge_base):
+    with gr.Blocks(
+        css="""
+        .container {max-width: 800px; margin: auto;}
+        .title {text-align: center; font-size: 2em; font-weight: bold; margin-bottom: 10px;}
+        .subtitle {text-align: center; font-size: 1em; color: gray; margin-bottom: 20px;}
+        #chatbox {height: 400px; overflow-y: auto; background-color: #000000; padding: 10px; border-radius: 5px;}
+        #chatbox p {margin: 0 0 10px;}
+        #chatbox .surgeon {color: #1f77b4; font-weight: bold;}
+        #chatbox .response {color: #ff7f0e;}
+        .input-row {display: flex; align-items: center; margin-top: 10px;}
+        .input-row .wrap {flex-grow: 1;}
+        .input-row textarea {width: 100%; resize: none;}
+        .input-row button {margin-left: 10px;}
+    """
+    ) as demo:
+        with gr.Column(elem_classes="container"):
+            gr.Markdown(
+                """
+                <div class="title">🏥 EHR Querying</div>
+                <div class="subtitle">Query EHR for potential complications</div>
+                """
+            )
+
+            output = gr.HTML(
+                label="Conversation",
+                elem_id="chatbox",
+            )
+            cache_stats = gr.Markdown()
+
+            with gr.Row(elem_classes="input-row"):
+                with gr.Column(elem_classes="wrap"):
+                    question = gr.Textbox(
+                        show_label=False,
+                        placeholder="Type your question here...",
+                        lines=1,
+                        max_lines=1,
                     )
-                    formatted += f"<p><span class='response'>Response:</span> {response_line}</p>"
-        return formatted
-
-    def updated_question_answer(question, chat_history):
-        # Get the updated chat history string
-        chat_history = question_answer(question, chat_history)
-        # Format the chat history for HTML display
-        formatted_history = format_chat_history(chat_history)
-        # Update the output HTML component and return the new state
-        return gr.update(value=formatted_history), chat_history
-
-    state = gr.State("")
-    btn.click(
-        updated_question_answer, inputs=[question, state], outputs=[output, state]
-    )
-    question.submit(
-        updated_question_answer, inputs=[question, state], outputs=[output, state]
-    )
-
-demo.launch()
+                btn = gr.Button("Send", variant="primary")
+
+        def format_chat_history(turns):
+            formatted = ""
+            for user_line, response_line in turns:
+                formatted += f"<p><span class='surgeon'>Surgeon:</span> {user_line}</p>"
+                formatted += f"<p><span class='response'>Response:</span> {response_line}</p>"
+            return formatted
+
+        def format_cache_stats():
+            stats = answer_cache.stats()
+            return (
+                f"Answer cache: {stats['hits']}/{stats['lookups']} hits"
+                f" ({stats['hit_rate']:.0%}), {stats['latency_saved_s']}s saved"
+            )
+
+        def updated_question_answer(question, session):
+            # One session per browser tab, holding the chain and structured history
+            if session is None:
+                session = EHRSession(
+                    knowledge_base, cache=answer_cache, doc_key=ehr_index.version(PATIENT)
+                )
+            # Re-render as tokens arrive
+            for partial in question_answer(question, session):
+                pending = session.turns + [(question, partial)]
+                yield gr.update(value=format_chat_history(pending)), gr.update(), session
+            yield (
+                gr.update(value=format_chat_history(session.turns)),
+                gr.update(value=format_cache_stats()),
+                session,
+            )
+
+        state = gr.State(None)
+        outputs = [output, cache_stats, state]
+        btn.click(updated_question_answer, inputs=[question, state], outputs=outputs)
+        question.submit(updated_question_answer, inputs=[question, state], outputs=outputs)
+    return demo
+
+
+# Everything is built here, so extraction workers (which re-import this module
+# under spawn) only pay for the imports
+if __name__ == "__main__":
+    ehr_index, answer_cache = load_index()
+    # Load the knowledge base once at the start
+    knowledge_base = create_knowledge_base(ehr_index, answer_cache, "patient.pdf", PATIENT)
+    demo = build_demo(ehr_index, answer_cache, knowledge_base)
+    demo.queue().launch()  # The queue is needed for streamed (generator) updates
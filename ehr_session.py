@@ -0,0 +1,176 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain.callbacks import get_openai_callback
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.chains import ConversationalRetrievalChain
+from langchain.chains.conversational_retrieval.base import _get_chat_history
+from langchain.chat_models import ChatOpenAI
+
+SUMMARY_PROMPT = """Summarize this conversation between a surgeon and an EHR assistant in a few sentences, keeping patient facts, findings and open questions.
+
+Summary so far:
+{summary}
+
+New exchanges:
+{exchanges}
+
+Updated summary:"""
+
+_DONE = object()
+
+
+class _TokenQueue(BaseCallbackHandler):
+    """Forwards streamed LLM tokens to whichever queue the current question uses."""
+
+    def __init__(self):
+        self.queue = None
+
+    def on_llm_new_token(self, token, **kwargs):
+        if self.queue is not None:
+            self.queue.put(token)
+
+
+class EHRSession:
+    """One surgeon's conversation over a knowledge base.
+
+    The chain and its LLM clients are built once and reused for every
+    question. History is kept as (question, answer) pairs; only the last
+    max_turns go into the prompt verbatim, older turns are folded into a
+    running summary so the prompt stays bounded. Summaries are written by a
+    background worker, off the answer path; a turn stays in the prompt
+    verbatim until it has been folded in.
+
+    With an answer cache, each question is first rewritten into a standalone
+    question, which is looked up in the cache under doc_key before the
+    retrieval round trip.
+    """
+
+    def __init__(
+        self, knowledge_base, model_name="gpt-4", max_turns=4, cache=None, doc_key=None
+    ):
+        self.max_turns = max_turns
+        self.cache = cache
+        self.doc_key = doc_key
+        self.turns = []
+        self.last_sources = []
+        self.summary = ""
+        self._folded = 0  # Turns already in the summary
+        self._summarizer = ThreadPoolExecutor(max_workers=1)  # Folds turns in order
+        self.total_cost = 0.0
+        self._tokens = _TokenQueue()
+        self._lock = threading.Lock()
+        # Only the answering LLM streams; condensing and summaries don't reach the UI
+        self.llm = ChatOpenAI(
+            model_name=model_name, temperature=0, streaming=True, callbacks=[self._tokens]
+        )
+        self.helper_llm = ChatOpenAI(model_name=model_name, temperature=0)
+        self.chain = ConversationalRetrievalChain.from_llm(
+            self.llm,
+            retriever=knowledge_base.as_retriever(),
+            condense_question_llm=self.helper_llm,
+            return_source_documents=True,
+        )
+
+    def history(self):
+        start = max(min(len(self.turns) - self.max_turns, self._folded), 0)
+        history = list(self.turns[start:])
+        if self.summary:
+            history.insert(0, ("Summarize our earlier conversation.", self.summary))
+        return history
+
+    def standalone_question(self, question):
+        history = self.history()
+        if not history:
+            return question
+        get_chat_history = self.chain.get_chat_history or _get_chat_history
+        return self.chain.question_generator.run(
+            question=question, chat_history=get_chat_history(history)
+        ).strip()
+
+    def ask(self, question):
+        """Yields the answer as it grows, token by token, then records the turn."""
+        with self._lock:  # One question at a time per session
+            if self.cache is not None:
+                # The chain would condense the question anyway; doing it here lets
+                # follow-ups hit the cache and the chain skip its own condense step
+                question_for_chain = self.standalone_question(question)
+                history = []
+                hit = self.cache.lookup(question_for_chain, self.doc_key)
+                if hit is not None:
+                    self.last_sources = hit["sources"]
+                    yield hit["answer"]
+                    self.add_turn(question, hit["answer"])
+                    return
+            else:
+                question_for_chain, history = question, self.history()
+
+            tokens = queue.Queue()
+            result = {}
+            start = time.perf_counter()
+
+            def run():
+                try:
+                    with get_openai_callback() as cb:
+                        result.update(
+                            self.chain(
+                                {"question": question_for_chain, "chat_history": history}
+                            )
+                        )
+                    self.total_cost += cb.total_cost
+                except Exception as e:
+                    result["error"] = e
+                finally:
+                    tokens.put(_DONE)
+
+            self._tokens.queue = tokens
+            threading.Thread(target=run, daemon=True).start()
+            answer = ""
+            while (token := tokens.get()) is not _DONE:
+                answer += token
+                yield answer
+            self._tokens.queue = None
+            if "error" in result:
+                raise result["error"]
+            answer = result["answer"]
+            self.last_sources = [
+                {"text": doc.page_content, **doc.metadata}
+                for doc in result.get("source_documents", [])
+            ]
+            if self.cache is not None:
+                self.cache.put(
+                    question_for_chain,
+                    self.doc_key,
+                    answer,
+                    self.last_sources,
+                    time.perf_counter() - start,
+                )
+            yield answer
+            self.add_turn(question, answer)
+
+    def add_turn(self, question, answer):
+        self.turns.append((question, answer))
+        if len(self.turns) > self.max_turns:
+            # The turn that just left the window goes into the summary
+            self._summarizer.submit(self._fold)
+
+    def _fold(self):
+        """Folds every turn that has left the window, but isn't summarized yet, into the summary."""
+        end = len(self.turns) - self.max_turns
+        if end <= self._folded:
+            return
+        exchanges = "\n".join(
+            f"Surgeon: {question}\nResponse: {answer}"
+            for question, answer in self.turns[self._folded : end]
+        )
+        try:
+            self.summary = self.helper_llm.predict(
+                SUMMARY_PROMPT.format(summary=self.summary or "(none)", exchanges=exchanges)
+            ).strip()
+        except Exception as e:
+            # Those turns stay in the prompt and are retried with the next fold
+            print(f"Could not update the conversation summary: {e}")
+            return
+        self._folded = end
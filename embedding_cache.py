@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+try:
+    from langchain.embeddings.base import Embeddings
+except ImportError:  # LangChain is only needed by the EHR app
+    Embeddings = object
+
+
+class EmbeddingCache:
+    """Content-addressed store of float32 vectors, keyed by hash(model + text)."""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            " WITHOUT ROWID"
+        )
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model, text):
+        return hashlib.sha1(f"{model}\0{text}".encode()).hexdigest()
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start : start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                found.update((k, np.frombuffer(v, dtype=np.float32)) for k, v in rows)
+        self.hits += len(found)
+        self.misses += len(set(keys)) - len(found)
+        return found
+
+    def put_many(self, items):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(k, np.asarray(v, dtype=np.float32).tobytes()) for k, v in items],
+            )
+            self._conn.commit()
+
+
+def plan_batches(texts, max_batch=256, max_tokens=8000):
+    """Packs texts into batches limited by count and by an approximate token budget."""
+    batches, batch, tokens = [], [], 0
+    for text in texts:
+        size = len(text) // 4 + 1  # ~4 characters per token
+        if batch and (len(batch) >= max_batch or tokens + size > max_tokens):
+            batches.append(batch)
+            batch, tokens = [], 0
+        batch.append(text)
+        tokens += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class CachedEmbedder:
+    """Wraps an async embedding function with the cache and a batcher.
+
+    Only texts missing from the cache are sent, deduplicated and packed into
+    batches of up to max_batch texts / max_tokens tokens, with at most
+    max_async batches in flight.
+    """
+
+    def __init__(self, func, model, cache, max_batch=256, max_tokens=8000, max_async=4):
+        self.func = func
+        self.model = model
+        self.cache = cache
+        self.max_batch = max_batch
+        self.max_tokens = max_tokens
+        self.max_async = max_async
+        self.calls = 0
+
+    async def __call__(self, texts):
+        keys = [self.cache.key(self.model, t) for t in texts]
+        vectors = self.cache.get_many(keys)
+        missing = list({k: t for k, t in zip(keys, texts) if k not in vectors}.items())
+        if missing:
+            semaphore = asyncio.Semaphore(self.max_async)
+            text_keys = dict((t, k) for k, t in missing)
+
+            async def embed(batch):
+                async with semaphore:
+                    self.calls += 1
+                    return batch, await self.func(batch)
+
+            results = await asyncio.gather(
+                *[
+                    embed(batch)
+                    for batch in plan_batches(
+                        [t for _, t in missing], self.max_batch, self.max_tokens
+                    )
+                ]
+            )
+            new = [(text_keys[t], v) for batch, vs in results for t, v in zip(batch, vs)]
+            self.cache.put_many(new)
+            vectors.update((k, np.asarray(v, dtype=np.float32)) for k, v in new)
+        return np.stack([vectors[k] for k in keys])
+
+
+def graphrag_embedding(working_dir, max_batch=256, max_async=4):
+    """OpenAI embeddings for GraphRAG, cached in working_dir/embeddings.sqlite."""
+    from nano_graphrag._llm import openai_embedding
+    from nano_graphrag._utils import wrap_embedding_func_with_attrs
+
+    os.makedirs(working_dir, exist_ok=True)
+    cache = EmbeddingCache(os.path.join(working_dir, "embeddings.sqlite"))
+    embedder = CachedEmbedder(
+        openai_embedding, "text-embedding-3-small", cache, max_batch, max_async=max_async
+    )
+    return wrap_embedding_func_with_attrs(
+        embedding_dim=openai_embedding.embedding_dim,
+        max_token_size=openai_embedding.max_token_size,
+    )(embedder)
+
+
+class CachedEmbeddings(Embeddings):
+    """LangChain embeddings that check the cache first and batch what is missing."""
+
+    def __init__(self, base, cache, model=None, max_batch=256, max_tokens=8000, max_async=4):
+        self.base = base
+        self.cache = cache
+        self.model = model or getattr(base, "model", type(base).__name__)
+        self.max_batch = max_batch
+        self.max_tokens = max_tokens
+        self.max_async = max_async
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        keys = [self.cache.key(self.model, t) for t in texts]
+        vectors = self.cache.get_many(keys)
+        missing = list({t: k for k, t in zip(keys, texts) if k not in vectors})
+        if missing:
+            batches = plan_batches(missing, self.max_batch, self.max_tokens)
+            self.calls += len(batches)
+            with ThreadPoolExecutor(max_workers=self.max_async) as executor:
+                results = executor.map(self.base.embed_documents, batches)
+                new = [
+                    (self.cache.key(self.model, t), v)
+                    for batch, vs in zip(batches, results)
+                    for t, v in zip(batch, vs)
+                ]
+            self.cache.put_many(new)
+            vectors.update((k, np.asarray(v, dtype=np.float32)) for k, v in new)
+        return [vectors[k].tolist() for k in keys]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
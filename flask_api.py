@@ -1,5 +1,7 @@
-from flask import Flask, render_template, Response
+from flask import Flask, render_template, Response, jsonify, request
+from collections import deque
 import threading
+import queue
 import cv2
 import time
 
@@ -8,7 +10,6 @@ import time
 # Ollama Client (MediTron 7B)
 # Uses 4o, 4o-Mini for Planning
 from nano_graphrag import GraphRAG
-from nano_graphrag._storage import Neo4jStorage
 import os
 import os
 import logging
@@ -18,9 +19,17 @@ from nano_graphrag import GraphRAG, QueryParam
 from nano_graphrag.base import BaseKVStorage
 from nano_graphrag._utils import compute_args_hash
 from neo4j_vis import (
+    GraphSnapshot,
+    StampedNeo4jStorage,
+    get_driver,
     visualize_neo4j_graph,
 )  # Visualize the Knowledge Graph on every Upsert
 from nano_graphrag._llm import gpt_4o_complete
+from window_query import TimelineIndex, windowed_query
+from sqlite_kv import SQLiteKVStorage
+from mmap_vdb import MmapVectorStorage
+from embedding_cache import graphrag_embedding
+from graph_layout import GraphLayout
 import cv2
 import json
 import os
@@ -44,14 +53,307 @@ neo4j_config = {
 }
 
 graph_func = GraphRAG(
-    graph_storage_cls=Neo4jStorage,
+    graph_storage_cls=StampedNeo4jStorage,  # Stamps writes for incremental visualization
+    key_string_value_json_storage_cls=SQLiteKVStorage,  # Indexed, no full-file rewrites
+    vector_db_storage_cls=MmapVectorStorage,  # Memory-mapped, append-only vectors
+    embedding_func=graphrag_embedding("./mohs"),  # Cached by content, batched calls
+    embedding_batch_num=256,  # Let the embedding batcher see whole upserts
     addon_params=neo4j_config,
     working_dir="./mohs",  # Can reload faster
 )
 
 
+ANALYSIS_PROMPT = """
+This is a CLIP from Moh's Cancer surgery. Identify ALL ENTITIES, their ROLES, RELATIONSHIPS, operations, and if ANY cancer treatment guidelines were violated or the patient responded abnormally BY DESCRIBING EACH STEP. FORMAT THIS IN HTML TAGS (<p></p> outermost). Append **** (4 ASTERISKS) at the end if anything was violated.
+"""
+ANALYSIS_WINDOW = 20  # Seconds of video per analysis window
+
+# (scale, JPEG quality) rungs, from full fidelity down to starved rural links
+ENCODING_LADDER = [(1.0, 85), (0.75, 75), (0.5, 65), (0.5, 50), (0.35, 40)]
+
+
+class EventHub:
+    """Pushes published events to every SSE subscriber, keeping a bounded history for resume."""
+
+    def __init__(self, history=50, keepalive=15):
+        self.history = deque(maxlen=history)  # (event id, data)
+        self.last_id = 0
+        self.keepalive = keepalive
+        self.subscribers = 0
+        self.cond = threading.Condition()
+
+    def publish(self, data):
+        with self.cond:
+            self.last_id += 1
+            self.history.append((self.last_id, data))
+            self.cond.notify_all()
+
+    def _events_after(self, event_id):
+        return [event for event in self.history if event[0] > event_id]
+
+    def subscribe(self, last_event_id=None):
+        """Yields SSE messages, starting after ``last_event_id`` or with the latest event.
+
+        Idle subscribers block on the condition, so they cost no CPU between events.
+        """
+        with self.cond:
+            self.subscribers += 1
+            if last_event_id is None:
+                pending = list(self.history)[-1:]
+            else:
+                pending = self._events_after(last_event_id)
+            seen = self.last_id
+        try:
+            while True:
+                for event_id, data in pending:
+                    lines = "".join(f"data: {line}\n" for line in data.splitlines() or [""])
+                    yield f"id: {event_id}\n{lines}\n"
+                with self.cond:
+                    if not self.cond.wait_for(lambda: self.last_id > seen, self.keepalive):
+                        pending = []
+                        yield ": keepalive\n\n"  # Lets proxies and dead clients time out
+                        continue
+                    pending = self._events_after(seen)
+                    seen = self.last_id
+        finally:
+            with self.cond:
+                self.subscribers -= 1
+
+    def stats(self):
+        with self.cond:
+            return {"last_event_id": self.last_id, "subscribers": self.subscribers}
+
+
+class AnalysisWorker:
+    """Runs GraphRAG queries on a background thread, off the frame clock."""
+
+    def __init__(self, graph_func, hub=None, max_pending=2):
+        self.graph_func = graph_func
+        self.timeline = TimelineIndex(graph_func)
+        self.hub = hub
+        self.jobs = queue.Queue(maxsize=max_pending)
+        self.lock = threading.Lock()
+        self.result = ""
+        self.window = -1
+        self.last_query_seconds = 0.0
+        self.dropped_jobs = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, window, mode="local"):
+        """Queues an "analyze window N" job, dropping the oldest one if the queue is full.
+
+        Jobs are answered from the window's chunks; mode="global" runs a full
+        global search instead.
+        """
+        while True:
+            try:
+                self.jobs.put_nowait((window, mode))
+                return
+            except queue.Full:
+                try:
+                    self.jobs.get_nowait()
+                    with self.lock:
+                        self.dropped_jobs += 1
+                except queue.Empty:
+                    pass
+
+    def _run(self):
+        while True:
+            window, mode = self.jobs.get()
+            start = time.perf_counter()
+            try:
+                result = windowed_query(
+                    self.graph_func,
+                    self.timeline,
+                    ANALYSIS_PROMPT,
+                    window,
+                    ANALYSIS_WINDOW,
+                    mode,
+                )
+            except Exception:
+                logging.exception(f"Analysis of window {window} failed")
+                continue
+            with self.lock:
+                self.result = result
+                self.window = window
+                self.last_query_seconds = time.perf_counter() - start
+            if self.hub is not None:
+                self.hub.publish(result)
+
+    def get_result(self):
+        with self.lock:
+            return self.result
+
+    def stats(self):
+        with self.lock:
+            return {
+                "window": self.window,
+                "last_query_seconds": round(self.last_query_seconds, 3),
+                "pending_jobs": self.jobs.qsize(),
+                "dropped_jobs": self.dropped_jobs,
+            }
+
+
+class FrameJitter:
+    """Tracks how far inter-frame intervals drift from the target frame time."""
+
+    def __init__(self, frame_time, history=600):
+        self.frame_time = frame_time
+        self.intervals = deque(maxlen=history)
+        self.last_frame = None
+        self.lock = threading.Lock()
+
+    def tick(self):
+        now = time.perf_counter()
+        with self.lock:
+            if self.last_frame is not None:
+                self.intervals.append(now - self.last_frame)
+            self.last_frame = now
+
+    def stats(self):
+        with self.lock:
+            intervals = sorted(self.intervals)
+        if not intervals:
+            return {"frames": 0}
+        deviations = [abs(i - self.frame_time) for i in intervals]
+        return {
+            "frames": len(intervals),
+            "target_ms": round(self.frame_time * 1000, 2),
+            "mean_interval_ms": round(sum(intervals) / len(intervals) * 1000, 2),
+            "mean_jitter_ms": round(sum(deviations) / len(deviations) * 1000, 2),
+            "p99_interval_ms": round(intervals[int(0.99 * (len(intervals) - 1))] * 1000, 2),
+            "max_interval_ms": round(intervals[-1] * 1000, 2),
+        }
+
+
+class FrameEncoder:
+    """Encodes a frame at a ladder rung, reusing the resize buffer of each rung."""
+
+    def __init__(self, ladder=ENCODING_LADDER):
+        self.ladder = ladder
+        self.buffers = {}
+
+    def encode(self, frame, rung):
+        scale, quality = self.ladder[rung]
+        if scale != 1.0:
+            height, width = frame.shape[:2]
+            size = (max(1, int(width * scale)), max(1, int(height * scale)))
+            buffer = self.buffers.get(rung)
+            if buffer is None or buffer.shape[1::-1] != size:
+                buffer = None
+            buffer = cv2.resize(frame, size, dst=buffer, interpolation=cv2.INTER_AREA)
+            self.buffers[rung] = buffer
+            frame = buffer
+        ret, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return encoded.tobytes()
+
+
+class RateController:
+    """Picks a ladder rung for one client from how long each frame takes to send."""
+
+    def __init__(self, frame_time, rungs, rung=0, fixed=False):
+        self.frame_time = frame_time
+        self.rungs = rungs
+        self.rung = rung
+        self.fixed = fixed
+        self.send_time = 0.0  # Exponentially weighted seconds per frame
+        self.frames_since_change = 0
+
+    def update(self, send_seconds):
+        self.send_time = 0.8 * self.send_time + 0.2 * send_seconds
+        self.frames_since_change += 1
+        if self.fixed or self.frames_since_change < 10:
+            return self.rung
+        if self.send_time > 0.8 * self.frame_time and self.rung < self.rungs - 1:
+            self.rung += 1  # The link cannot keep up, send fewer bytes
+            self.frames_since_change = 0
+        elif self.send_time < 0.3 * self.frame_time and self.rung > 0:
+            self.rung -= 1  # Plenty of headroom, step quality back up
+            self.frames_since_change = 0
+        return self.rung
+
+
+class FrameBus:
+    """Ring buffer of encoded frames that any number of clients read at their own pace.
+
+    Each entry maps ladder rung -> JPEG bytes; the producer only encodes the rungs
+    that some subscriber is currently reading.
+    """
+
+    def __init__(self, size=8):
+        self.frames = deque(maxlen=size)  # (sequence number, {rung: JPEG bytes})
+        self.seq = 0
+        self.closed = False
+        self.rung_readers = {}
+        self.dropped_frames = 0
+        self.cond = threading.Condition()
+
+    def active_rungs(self):
+        with self.cond:
+            return [rung for rung, count in self.rung_readers.items() if count > 0]
+
+    def publish(self, encoded):
+        with self.cond:
+            self.seq += 1
+            self.frames.append((self.seq, encoded))
+            self.cond.notify_all()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def _move_reader(self, old_rung, new_rung):
+        if old_rung is not None:
+            self.rung_readers[old_rung] -= 1
+        if new_rung is not None:
+            self.rung_readers[new_rung] = self.rung_readers.get(new_rung, 0) + 1
+
+    def subscribe(self, controller):
+        """Yields the newest frame at the controller's rung; slow readers skip frames.
+
+        The time between a yield and the next resume is how long the server took to
+        write the frame to the client, which drives the controller.
+        """
+        rung = controller.rung
+        with self.cond:
+            self._move_reader(None, rung)
+            last_seq = self.seq
+        try:
+            while True:
+                with self.cond:
+                    self.cond.wait_for(lambda: self.seq > last_seq or self.closed)
+                    if self.seq <= last_seq:
+                        return  # Closed and fully drained
+                    seq, encoded = self.frames[-1]
+                    self.dropped_frames += seq - last_seq - 1
+                last_seq = seq
+                # Right after a rung change the newest frame may not carry it yet
+                frame = encoded.get(rung) or encoded[min(encoded, key=lambda r: abs(r - rung))]
+                sent = time.perf_counter()
+                yield frame
+                new_rung = controller.update(time.perf_counter() - sent)
+                if new_rung != rung:
+                    with self.cond:
+                        self._move_reader(rung, new_rung)
+                    rung = new_rung
+        finally:
+            with self.cond:
+                self._move_reader(rung, None)
+
+    def stats(self):
+        with self.cond:
+            return {
+                "published": self.seq,
+                "subscribers": sum(self.rung_readers.values()),
+                "readers_per_rung": {r: c for r, c in self.rung_readers.items() if c},
+                "dropped_frames": self.dropped_frames,
+            }
+
+
 class VideoStreamer:
-    def __init__(self, video_path):
+    def __init__(self, video_path, ladder=ENCODING_LADDER):
         self.cap = cv2.VideoCapture(video_path)
         if not self.cap.isOpened():
             print("Error: Cannot open video file.")
@@ -59,16 +361,29 @@ class VideoStreamer:
         self.frame_count = 0
         self.elapsed_time = 0
         self.lock = threading.Lock()
-        self.text_update = ""
-        self.last_query_time = -20  # Initialize to -20 to allow immediate query
-        self.graph_func = graph_func  # Assume graph_func is already defined
+        self.last_query_window = -1  # Allows an immediate query for window 0
+        self.text_hub = EventHub()
+        self.analysis = AnalysisWorker(graph_func, self.text_hub)  # Assume graph_func is already defined
+        self.jitter = FrameJitter(1.0 / self.fps)
+        self.encoder = FrameEncoder(ladder)
+        self.bus = FrameBus()
+        self.producer = None
 
-    def generate_frames(self):
-        """Yields video frames for streaming at real-time speed."""
+    def start(self):
+        """Starts the single decode-and-encode producer the first time a client connects."""
+        with self.lock:
+            if self.producer is None:
+                self.producer = threading.Thread(target=self._produce, daemon=True)
+                self.producer.start()
+
+    def _produce(self):
+        """Decodes each frame once and encodes it at every rung in use, at real-time speed."""
         frame_time = 1.0 / self.fps  # Calculate the time per frame
+        deadline = time.perf_counter()
+        frame = None  # Reused decode buffer
 
         while True:
-            success, frame = self.cap.read()
+            success, frame = self.cap.read(frame)
             if not success:
                 print("End of video or cannot read frame.")
                 break  # Exit when the video ends
@@ -77,35 +392,59 @@ class VideoStreamer:
             with self.lock:
                 self.frame_count += 1
                 self.elapsed_time = self.frame_count / self.fps
+                window = int(self.elapsed_time) // ANALYSIS_WINDOW
+                new_window = window != self.last_query_window
+                self.last_query_window = window
 
-                # Every 20 seconds, query the database and update text
-                if (
-                    int(self.elapsed_time) % 20 == 0
-                    and int(self.elapsed_time) != self.last_query_time
-                ):
-                    # Perform the database query
-                    query_temp = """
-                    This is a CLIP from Moh's Cancer surgery. Identify ALL ENTITIES, their ROLES, RELATIONSHIPS, operations, and if ANY cancer treatment guidelines were violated or the patient responded abnormally BY DESCRIBING EACH STEP. FORMAT THIS IN HTML TAGS (<p></p> outermost). Append **** (4 ASTERISKS) at the end if anything was violated.
-                    """
-                    result = self.graph_func.query(query_temp)
-                    self.text_update = result
-                    self.last_query_time = int(self.elapsed_time)
-
-            # Encode the frame as JPEG
-            ret, buffer = cv2.imencode(".jpg", frame)
-            frame = buffer.tobytes()
-
-            # Stream the frame
-            yield (b"--frame\r\n" b"Content-Type: image/jpeg\r\n\r\n" + frame + b"\r\n")
+            # Every 20 seconds hand the window to the analysis worker; never wait on it
+            if new_window:
+                self.analysis.submit(window)
+
+            # Encode the frame once per rung that a client is reading
+            rungs = self.bus.active_rungs() or [0]
+            encoded = {rung: self.encoder.encode(frame, rung) for rung in rungs}
 
-            # Sleep to match the frame rate
-            time.sleep(frame_time)
+            # Publish the frame to every subscriber
+            self.jitter.tick()
+            self.bus.publish(encoded)
+
+            # Pace by deadline so encode time is not added on top of the frame time
+            deadline += frame_time
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -frame_time:
+                deadline = time.perf_counter()  # Fell behind; don't burst to catch up
 
         self.cap.release()  # Release the video capture when done
+        self.bus.close()
+
+    def generate_frames(self, rung=None):
+        """Yields the shared stream as multipart JPEG for one client.
+
+        With ``rung`` set the client is pinned to that ladder rung, otherwise the
+        rung adapts to the client's throughput.
+        """
+        self.start()
+        controller = RateController(
+            1.0 / self.fps,
+            len(self.encoder.ladder),
+            rung=rung or 0,
+            fixed=rung is not None,
+        )
+        for frame in self.bus.subscribe(controller):
+            yield (b"--frame\r\n" b"Content-Type: image/jpeg\r\n\r\n" + frame + b"\r\n")
 
     def get_text_update(self):
-        with self.lock:
-            return self.text_update
+        return self.analysis.get_result()
+
+    def stats(self):
+        return {
+            "frames": self.jitter.stats(),
+            "bus": self.bus.stats(),
+            "analysis": self.analysis.stats(),
+            "text_feed": self.text_hub.stats(),
+        }
 
 
 # Initialize the VideoStreamer
@@ -114,26 +453,72 @@ video_streamer = VideoStreamer("mohs.mp4")  # Replace with your video file
 
 @app.route("/video_feed")
 def video_feed():
+    # ?rung=N pins the encoding ladder rung; omit it to adapt to the client's link
+    rung = request.args.get("rung", type=int)
+    if rung is not None:
+        rung = min(max(rung, 0), len(ENCODING_LADDER) - 1)
     return Response(
-        video_streamer.generate_frames(),
+        video_streamer.generate_frames(rung),
         mimetype="multipart/x-mixed-replace; boundary=frame",
     )
 
 
-def event_stream():
-    previous_update = ""
-    while True:
-        text_update = video_streamer.get_text_update()
-        if text_update and text_update != previous_update:
-            yield f"data: {text_update}\n\n"
-            previous_update = text_update
-            print(previous_update)
-        time.sleep(1)
-
-
 @app.route("/text_feed")
 def text_feed():
-    return Response(event_stream(), mimetype="text/event-stream")
+    # EventSource sends Last-Event-ID when it reconnects, so missed results are replayed
+    last_event_id = request.headers.get("Last-Event-ID", type=int)
+    return Response(
+        video_streamer.text_hub.subscribe(last_event_id),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/global_analysis")
+def global_analysis():
+    # Full global search over all community reports, only when asked for
+    window = video_streamer.analysis.stats()["window"]
+    video_streamer.analysis.submit(max(window, 0), mode="global")
+    return jsonify({"queued": "global"})
+
+
+@app.route("/stats")
+def stats():
+    return jsonify(video_streamer.stats())
+
+
+# Level-of-detail graph views, laid out server side and fetched as compact JSON
+graph_layout = GraphLayout(
+    GraphSnapshot(
+        get_driver(neo4j_config["neo4j_url"], *neo4j_config["neo4j_auth"]),
+        graph_func.chunk_entity_relation_graph.namespace,  # Lets refreshes use the watermark index
+    ),
+    cache_file="./mohs/graph_layout.json",
+)
+
+
+def compact_json(data):
+    return Response(json.dumps(data, separators=(",", ":")), mimetype="application/json")
+
+
+def expanded_communities():
+    return [int(c) for c in request.args.get("expanded", "").split(",") if c]
+
+
+@app.route("/graph")
+def graph_view():
+    # ?since=<version> sends only what was placed after it; ?expanded=1,4 opens communities
+    graph_layout.update()
+    since = request.args.get("since", type=int)
+    return compact_json(graph_layout.view(expanded_communities(), since=since))
+
+
+@app.route("/graph/community/<int:community>")
+def graph_expand(community):
+    graph_layout.update()
+    return compact_json(
+        graph_layout.view(expanded_communities(), only_community=community)
+    )
 
 
 @app.route("/")
@@ -0,0 +1,240 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+
+import networkx as nx
+
+SCALE = 1000.0  # Layout coordinates span roughly [-SCALE, SCALE]
+
+
+def node_label(properties):
+    return str(properties.get("id", "Unknown")).strip('"')
+
+
+class GraphLayout:
+    """Server-side layout and level-of-detail views over a GraphSnapshot.
+
+    Nodes are grouped into Louvain communities. The community graph is laid
+    out first and each community's members are laid out around their
+    community's position, so no layout runs over the whole graph. Positions
+    are cached (and saved to cache_file), so later updates only place new
+    nodes next to their neighbours; a full relayout happens when more than
+    relayout_fraction of the graph is new.
+
+    Views show each community of at least min_cluster nodes as a single
+    super-node unless it is expanded, once the graph has more than
+    max_visible nodes. Views are compact: nodes are
+    [id, label, x, y, size, community] and edges [source, target, count],
+    with small integer ids (super-nodes are negative).
+    """
+
+    def __init__(
+        self,
+        snapshot,
+        cache_file=None,
+        max_visible=500,
+        min_cluster=3,
+        relayout_fraction=0.2,
+        min_interval=2.0,
+    ):
+        self.snapshot = snapshot
+        self.cache_file = cache_file
+        self.max_visible = max_visible
+        self.min_cluster = min_cluster
+        self.relayout_fraction = relayout_fraction
+        self.min_interval = min_interval  # Seconds between Neo4j refreshes
+        self.version = 0
+        self.positions = {}  # element_id -> (x, y)
+        self.community = {}  # element_id -> community id
+        self.ids = {}  # element_id -> compact id
+        self.placed_at = {}  # element_id -> layout version that last moved it
+        self.community_placed_at = {}  # community id -> version that last moved or grew it
+        self.collapse_all = False  # Whether views collapse communities at all
+        self.collapse_changed_at = 0  # Layout version where collapse_all last flipped
+        self._snapshot_version = None
+        self._refreshed = 0.0
+        self._lock = threading.Lock()
+        if cache_file and os.path.exists(cache_file):
+            with open(cache_file) as f:
+                cached = json.load(f)
+            for element_id, (x, y, community) in cached.items():
+                self.positions[element_id] = (x, y)
+                self.community[element_id] = community
+
+    def update(self):
+        """Refreshes the snapshot and lays out what changed; returns the layout version."""
+        with self._lock:
+            if time.time() - self._refreshed < self.min_interval:
+                return self.version
+            self.snapshot.refresh()
+            self._refreshed = time.time()
+            if self.snapshot.version == self._snapshot_version:
+                return self.version
+            self._snapshot_version = self.snapshot.version
+            U = nx.Graph(self.snapshot.graph.to_undirected())
+            new = [node for node in U if node not in self.positions]
+            self.version += 1
+            if len(new) > self.relayout_fraction * len(U) or not self.positions:
+                self._layout_all(U)
+            else:
+                self._place(U, new)
+            for node in U:
+                self.ids.setdefault(node, len(self.ids))
+            collapse_all = len(U) > self.max_visible
+            if collapse_all != self.collapse_all:
+                # Every node changes between real and super-node, so clients need it all
+                self.collapse_all = collapse_all
+                self.collapse_changed_at = self.version
+            self._save(U)
+            return self.version
+
+    def _layout_all(self, U):
+        self.positions, self.community = {}, {}
+        if not len(U):
+            return
+        communities = nx.community.louvain_communities(U, seed=0)
+        for cid, members in enumerate(communities):
+            for node in members:
+                self.community[node] = cid
+
+        C = nx.Graph()
+        C.add_nodes_from(range(len(communities)))
+        for u, v in U.edges():
+            cu, cv = self.community[u], self.community[v]
+            if cu != cv:
+                weight = C.get_edge_data(cu, cv, {"weight": 0})["weight"]
+                C.add_edge(cu, cv, weight=weight + 1)
+        centers = nx.spring_layout(C, weight="weight", seed=0, scale=SCALE)
+
+        for cid, members in enumerate(communities):
+            cx, cy = centers[cid]
+            if len(members) == 1:
+                (node,) = members
+                self.positions[node] = (float(cx), float(cy))
+                continue
+            # Area proportional to community size
+            radius = SCALE * (len(members) / len(U)) ** 0.5 / 2
+            local = nx.spring_layout(
+                U.subgraph(members),
+                seed=0,
+                scale=radius,
+                iterations=50 if len(members) < 1000 else 15,
+            )
+            for node, (x, y) in local.items():
+                self.positions[node] = (float(cx + x), float(cy + y))
+        self.placed_at = dict.fromkeys(U, self.version)
+        self.community_placed_at = dict.fromkeys(range(len(communities)), self.version)
+
+    def _place(self, U, new):
+        """Puts new nodes next to their placed neighbours, in their majority community."""
+        rng = random.Random(self.version)
+        next_community = max(self.community.values(), default=-1) + 1
+        # Nodes connected to already placed nodes go first
+        pending = sorted(new, key=lambda n: -sum(m in self.positions for m in U[n]))
+        for node in pending:
+            placed = [m for m in U[node] if m in self.positions]
+            jitter = SCALE * 0.01
+            if placed:
+                x = sum(self.positions[m][0] for m in placed) / len(placed)
+                y = sum(self.positions[m][1] for m in placed) / len(placed)
+                votes = Counter(self.community[m] for m in placed)
+                self.community[node] = votes.most_common(1)[0][0]
+            else:
+                x, y, jitter = 0.0, 0.0, SCALE
+                self.community[node] = next_community
+                next_community += 1
+            self.positions[node] = (
+                x + rng.uniform(-jitter, jitter),
+                y + rng.uniform(-jitter, jitter),
+            )
+            self.placed_at[node] = self.version
+            self.community_placed_at[self.community[node]] = self.version
+
+    def _save(self, U):
+        if not self.cache_file:
+            return
+        with open(self.cache_file + ".tmp", "w") as f:
+            json.dump(
+                {
+                    node: [round(x, 1), round(y, 1), self.community[node]]
+                    for node, (x, y) in self.positions.items()
+                    if node in U
+                },
+                f,
+                separators=(",", ":"),
+            )
+        os.replace(self.cache_file + ".tmp", self.cache_file)
+
+    def view(self, expanded=(), since=None, only_community=None):
+        """Compact view of the graph with unexpanded communities collapsed.
+
+        With since (a layout version the client already has), only real nodes
+        placed after it and super-nodes of communities that moved or grew after
+        it are sent, plus the edges touching what is sent. With only_community,
+        just that community's members.
+        """
+        with self._lock:
+            G = self.snapshot.graph
+            members = defaultdict(list)
+            for node in G:
+                if node in self.community:
+                    members[self.community[node]].append(node)
+            if since is not None and since > self.version:
+                since = None  # The client's version is from before a restart
+            if since is not None and since < self.collapse_changed_at:
+                since = None
+            expanded = set(expanded)
+            if only_community is not None:
+                expanded.add(only_community)
+
+            def collapsed(cid):
+                return (
+                    self.collapse_all
+                    and cid not in expanded
+                    and len(members[cid]) >= self.min_cluster
+                )
+
+            def visible_id(node):
+                cid = self.community[node]
+                return -cid - 1 if collapsed(cid) else self.ids[node]
+
+            nodes, sent = [], set()
+            if only_community is None:
+                for cid, group in members.items():
+                    if not collapsed(cid):
+                        continue
+                    if since is not None and self.community_placed_at.get(cid, 0) <= since:
+                        continue
+                    head = max(group, key=G.degree)
+                    x = sum(self.positions[n][0] for n in group) / len(group)
+                    y = sum(self.positions[n][1] for n in group) / len(group)
+                    label = node_label(G.nodes[head]["properties"])
+                    nodes.append([-cid - 1, label, round(x, 1), round(y, 1), len(group), cid])
+                    sent.add(-cid - 1)
+            for node in G:
+                if node not in self.positions:
+                    continue
+                cid = self.community[node]
+                if collapsed(cid):
+                    continue
+                if only_community is not None and cid != only_community:
+                    continue
+                if since is not None and self.placed_at.get(node, 0) <= since:
+                    continue
+                x, y = self.positions[node]
+                label = node_label(G.nodes[node]["properties"])
+                nodes.append([self.ids[node], label, round(x, 1), round(y, 1), 1, cid])
+                sent.add(self.ids[node])
+
+            counts = Counter()
+            for u, v in G.edges():
+                if u not in self.positions or v not in self.positions:
+                    continue
+                a, b = visible_id(u), visible_id(v)
+                if a != b and (a in sent or b in sent):
+                    counts[a, b] += 1
+            edges = [[a, b, count] for (a, b), count in counts.items()]
+            return {"version": self.version, "nodes": nodes, "edges": edges}
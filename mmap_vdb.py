@@ -0,0 +1,298 @@
+import asyncio
+import base64
+import json
+import os
+from dataclasses import dataclass
+
+import numpy as np
+from nano_graphrag.base import BaseVectorStorage
+
+from ann_index import build_index, load_index
+
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+
+@dataclass
+class MmapVectorStorage(BaseVectorStorage):
+    """Vector storage kept as a memory-mapped binary matrix plus a JSON-lines sidecar.
+
+    Files in the working directory, per namespace:
+      vdb_{ns}.header.json  embedding dim and row dtype
+      vdb_{ns}.vec          normalized rows, appended and never rewritten
+      vdb_{ns}.scale        per-row float32 scales (int8 mode only)
+      vdb_{ns}.meta.jsonl   one line per upsert: id, row and meta fields
+
+    An upsert of an existing id appends a new row and the old one is masked
+    out, so nothing is rewritten. Set addon_params["mmap_vdb"]["dtype"] to
+    "float16" or "int8" to shrink the matrix. An old nano-vectordb
+    vdb_{ns}.json is imported on first use.
+
+    Queries scan the whole matrix unless addon_params["mmap_vdb"]["index"]
+    names an ANN index (see ann_index.build_index), which is kept up to date
+    on every upsert and saved next to the matrix.
+    """
+
+    cosine_better_than_threshold: float = 0.2
+
+    def __post_init__(self):
+        working_dir = self.global_config["working_dir"]
+        options = self.global_config.get("addon_params", {}).get("mmap_vdb", {})
+        self._max_batch_size = self.global_config["embedding_batch_num"]
+        self.cosine_better_than_threshold = self.global_config.get(
+            "query_better_than_threshold", self.cosine_better_than_threshold
+        )
+        prefix = os.path.join(working_dir, f"vdb_{self.namespace}")
+        self._header_file = f"{prefix}.header.json"
+        self._vec_file = f"{prefix}.vec"
+        self._scale_file = f"{prefix}.scale"
+        self._meta_file = f"{prefix}.meta.jsonl"
+
+        if os.path.exists(self._header_file):
+            with open(self._header_file) as f:
+                header = json.load(f)
+        else:
+            header = {
+                "embedding_dim": self.embedding_func.embedding_dim,
+                "dtype": options.get("dtype", "float32"),
+            }
+            with open(self._header_file, "w") as f:
+                json.dump(header, f)
+        self._dim = header["embedding_dim"]
+        self._dtype = header["dtype"]
+
+        self._rows = 0
+        self._ids = {}  # id -> row
+        self._meta = {}  # id -> meta fields
+        self._row_ids = []  # row -> id
+        self._matrix = None  # Lazily (re)mapped after appends
+        self._scales = None
+        self._load()
+
+        self._index = None
+        self._rerank = options.get("rerank", 4)  # Exact rescoring of index candidates
+        index_options = options.get("index")
+        if index_options:
+            self._index_prefix = f"{prefix}.index"
+            self._index = load_index(index_options, self._index_prefix, self._dim)
+            self._indexed_rows = 0
+            if self._index is None:
+                self._index = build_index(index_options, self._dim)
+            elif os.path.exists(f"{self._index_prefix}.rows"):
+                with open(f"{self._index_prefix}.rows") as f:
+                    self._indexed_rows = int(f.read())
+            # Drop entries deleted since the index was saved
+            self._index.remove([id for id in self._index.keys() if id not in self._ids])
+            self._index_new_rows()
+
+        legacy_file = f"{prefix}.json"
+        if not self._rows and os.path.exists(legacy_file):
+            self._import_nano_vectordb(legacy_file)
+
+    def _load(self):
+        if not os.path.exists(self._meta_file):
+            return
+        with open(self._meta_file) as f:
+            for line in f:
+                entry = json.loads(line)
+                id = entry.pop("__id__")
+                row = entry.pop("__row__")
+                if entry.get("__deleted__"):
+                    self._ids.pop(id, None)
+                    self._meta.pop(id, None)
+                    continue
+                self._ids[id] = row
+                self._meta[id] = entry
+                self._row_ids.append(id)
+                self._rows = max(self._rows, row + 1)
+        # A crash between the vector and meta appends leaves rows with no meta; drop them
+        if self._stored_rows() > self._rows:
+            itemsize = np.dtype(DTYPES[self._dtype]).itemsize
+            with open(self._vec_file, "r+b") as f:
+                f.truncate(self._rows * self._dim * itemsize)
+            if os.path.exists(self._scale_file):
+                with open(self._scale_file, "r+b") as f:
+                    f.truncate(self._rows * 4)
+
+    def _stored_rows(self):
+        if not os.path.exists(self._vec_file):
+            return 0
+        itemsize = np.dtype(DTYPES[self._dtype]).itemsize
+        return os.path.getsize(self._vec_file) // (itemsize * self._dim)
+
+    def _import_nano_vectordb(self, legacy_file):
+        with open(legacy_file) as f:
+            legacy = json.load(f)
+        matrix = np.frombuffer(base64.b64decode(legacy["matrix"]), dtype=np.float32)
+        matrix = matrix.reshape(len(legacy["data"]), legacy["embedding_dim"])
+        ids = [d.pop("__id__") for d in legacy["data"]]
+        self._append(ids, matrix, legacy["data"])
+
+    def _quantize(self, vectors):
+        if self._dtype != "int8":
+            return vectors.astype(DTYPES[self._dtype]), None
+        scales = np.abs(vectors).max(axis=1, keepdims=True) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(vectors / scales).astype(np.int8), scales.astype(np.float32)
+
+    def _append(self, ids, vectors, metas):
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        rows, scales = self._quantize(vectors / norms)
+        # Vectors first, so the sidecar never points past the end of the matrix
+        with open(self._vec_file, "ab") as f:
+            f.write(rows.tobytes())
+        if scales is not None:
+            with open(self._scale_file, "ab") as f:
+                f.write(scales.tobytes())
+        with open(self._meta_file, "a") as f:
+            for i, (id, meta) in enumerate(zip(ids, metas)):
+                row = self._rows + i
+                f.write(json.dumps({"__id__": id, "__row__": row, **meta}) + "\n")
+                self._ids[id] = row
+                self._meta[id] = meta
+                self._row_ids.append(id)
+        self._rows += len(ids)
+        self._matrix = None
+        if self._index is not None:
+            self._index_new_rows()
+
+    def _index_new_rows(self):
+        """Adds rows appended since the index was last updated."""
+        matrix = self._mapped()
+        if matrix is None or self._indexed_rows >= self._rows:
+            return
+        rows = [
+            row
+            for row in range(self._indexed_rows, self._rows)
+            if self._ids.get(self._row_ids[row]) == row
+        ]
+        if rows:
+            vectors = np.asarray(matrix[rows], dtype=np.float32)
+            if self._dtype == "int8":
+                vectors *= np.asarray(self._scales[rows])[:, None]
+            self._index.add([self._row_ids[row] for row in rows], vectors)
+        self._indexed_rows = self._rows
+
+    def delete(self, ids):
+        """Removes ids by appending tombstones to the sidecar."""
+        ids = [id for id in ids if id in self._ids]
+        with open(self._meta_file, "a") as f:
+            for id in ids:
+                f.write(json.dumps({"__id__": id, "__row__": -1, "__deleted__": True}) + "\n")
+                del self._ids[id]
+                del self._meta[id]
+        if self._index is not None:
+            self._index.remove(ids)
+
+    def _mapped(self):
+        if self._matrix is None and self._rows:
+            self._matrix = np.memmap(
+                self._vec_file,
+                dtype=DTYPES[self._dtype],
+                mode="r",
+                shape=(self._rows, self._dim),
+            )
+            if self._dtype == "int8":
+                self._scales = np.memmap(
+                    self._scale_file, dtype=np.float32, mode="r", shape=(self._rows,)
+                )
+        return self._matrix
+
+    def _live_rows(self):
+        """Rows that are the latest version of their id."""
+        live = np.zeros(self._rows, dtype=bool)
+        live[[row for row in self._ids.values() if row < self._rows]] = True
+        return live
+
+    async def upsert(self, data: dict[str, dict]):
+        if not data:
+            return []
+        ids = list(data.keys())
+        metas = [
+            {k: v for k, v in d.items() if k in self.meta_fields} for d in data.values()
+        ]
+        contents = [d["content"] for d in data.values()]
+        batches = [
+            contents[i : i + self._max_batch_size]
+            for i in range(0, len(contents), self._max_batch_size)
+        ]
+        embeddings_list = await asyncio.gather(
+            *[self.embedding_func(batch) for batch in batches]
+        )
+        self._append(ids, np.concatenate(embeddings_list).astype(np.float32), metas)
+        return ids
+
+    def scores(self, query_vector):
+        """Cosine similarity of query_vector against every stored row."""
+        matrix = self._mapped()
+        if matrix is None:
+            return np.zeros(0, dtype=np.float32)
+        query_vector = (query_vector / (np.linalg.norm(query_vector) or 1.0)).astype(
+            np.float32
+        )
+        if self._dtype == "int8":
+            return (matrix @ query_vector) * self._scales
+        return matrix @ query_vector
+
+    def search(self, query_vector, top_k):
+        """Returns (id, similarity) pairs for the top_k live rows, best first."""
+        if self._index is not None and len(self._index):
+            query_vector = query_vector / (np.linalg.norm(query_vector) or 1.0)
+            candidates = self._index.search(
+                query_vector.astype(np.float32), top_k * max(self._rerank, 1)
+            )
+            if self._rerank <= 1:
+                return candidates[:top_k]
+            candidates = [c for c in candidates if c[0] in self._ids]
+            rows = [self._ids[id] for id, _ in candidates]
+            exact = np.asarray(self._mapped()[rows], dtype=np.float32) @ query_vector
+            if self._dtype == "int8":
+                exact *= np.asarray(self._scales[rows])
+            order = np.argsort(-exact)[:top_k]
+            return [(candidates[i][0], float(exact[i])) for i in order]
+        scores = np.where(self._live_rows(), self.scores(query_vector), -np.inf)
+        top_k = min(top_k, int(np.isfinite(scores).sum()))
+        if top_k <= 0:
+            return []
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        return [(self._row_ids[row], float(scores[row])) for row in top]
+
+    async def query(self, query: str, top_k=5):
+        embedding = (await self.embedding_func([query]))[0]
+        return [
+            {**self._meta[id], "id": id, "distance": score}
+            for id, score in self.search(np.asarray(embedding, dtype=np.float32), top_k)
+            if score >= self.cosine_better_than_threshold
+        ]
+
+    def _save_index(self):
+        if self._index is not None:
+            self._index.save(self._index_prefix)
+            with open(f"{self._index_prefix}.rows", "w") as f:
+                f.write(str(self._indexed_rows))
+
+    async def index_done_callback(self):
+        # Appends are written as they happen; only the ANN index needs saving
+        self._save_index()
+
+    def compact(self):
+        """Rewrites the files without superseded rows."""
+        matrix = self._mapped()
+        if matrix is None:
+            return
+        ids = list(self._ids)
+        rows = [self._ids[id] for id in ids]
+        vectors = np.asarray(matrix[rows], dtype=np.float32)
+        if self._dtype == "int8":
+            vectors *= np.asarray(self._scales[rows])[:, None]
+        metas = [self._meta[id] for id in ids]
+        self._matrix = self._scales = None
+        for path in (self._vec_file, self._scale_file, self._meta_file):
+            if os.path.exists(path):
+                os.remove(path)
+        self._rows, self._ids, self._meta, self._row_ids = 0, {}, {}, []
+        self._indexed_rows = 0  # Re-adding an id replaces its old index entry
+        self._append(ids, vectors, metas)
+        # The saved row count refers to the old files; a stale one would skip new rows
+        self._save_index()
@@ -3,7 +3,6 @@
 # Ollama Client (MediTron 7B)
 # Uses 4o, 4o-Mini for Planning
 from nano_graphrag import GraphRAG
-from nano_graphrag._storage import Neo4jStorage
 import os
 import os
 import logging
@@ -13,12 +12,21 @@ from nano_graphrag import GraphRAG, QueryParam
 from nano_graphrag.base import BaseKVStorage
 from nano_graphrag._utils import compute_args_hash
 from neo4j_vis import (
+    StampedNeo4jStorage,
     visualize_neo4j_graph,
 )  # Visualize the Knowledge Graph on every Upsert
 from nano_graphrag._llm import gpt_4o_complete
+from transcript_ingest import TranscriptIngestor
+from window_query import TimelineIndex, windowed_query
+from sqlite_kv import SQLiteKVStorage
+from mmap_vdb import MmapVectorStorage
+from embedding_cache import graphrag_embedding
 import cv2
 import json
 import os
+import asyncio
+import time
+import weakref
 
 logging.basicConfig(level=logging.WARNING)
 logging.getLogger("nano-graphrag").setLevel(logging.INFO)
@@ -30,6 +38,104 @@ os.environ["OPENAI_API_KEY"] = (
 
 # Ollama Model (Medical Domain Specific)
 MODEL = "meditron"
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://localhost:11434")
+OLLAMA_MAX_CONCURRENCY = int(os.environ.get("OLLAMA_MAX_CONCURRENCY", "4"))
+# Seconds to hold the first request of a burst so its peers reach Ollama together
+OLLAMA_BATCH_WINDOW = float(os.environ.get("OLLAMA_BATCH_WINDOW", "0"))
+
+
+class OllamaPool:
+    """Keep-alive Ollama clients with bounded concurrency and per-call stats.
+
+    httpx connections are bound to an event loop, so one AsyncClient is kept per
+    loop. Identical in-flight requests share a single call, and with a batch
+    window set, requests that arrive together are released together so Ollama
+    can schedule them into the same parallel batch.
+    """
+
+    def __init__(
+        self,
+        host=OLLAMA_HOST,
+        max_concurrency=OLLAMA_MAX_CONCURRENCY,
+        batch_window=OLLAMA_BATCH_WINDOW,
+    ):
+        self.host = host
+        self.max_concurrency = max_concurrency
+        self.batch_window = batch_window
+        self._loops = weakref.WeakKeyDictionary()  # loop -> per-loop client state
+        self.calls = 0
+        self.coalesced = 0
+        self.total_seconds = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def _state(self):
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is None:
+            state = {
+                "client": ollama.AsyncClient(host=self.host),
+                "semaphore": asyncio.Semaphore(self.max_concurrency),
+                "inflight": {},
+                "batch": None,
+            }
+            self._loops[loop] = state
+        return state
+
+    async def _wait_for_batch(self, state):
+        if self.batch_window <= 0:
+            return
+        if state["batch"] is None:
+            batch = state["batch"] = asyncio.get_running_loop().create_future()
+            try:
+                await asyncio.sleep(self.batch_window)
+            finally:
+                # Release the other waiters even if this one is cancelled
+                batch.set_result(None)
+                state["batch"] = None
+        else:
+            await asyncio.shield(state["batch"])
+
+    async def _call(self, state, messages, kwargs):
+        await self._wait_for_batch(state)
+        async with state["semaphore"]:
+            start = time.perf_counter()
+            response = await state["client"].chat(
+                model=MODEL, messages=messages, **kwargs
+            )
+        self.calls += 1
+        self.total_seconds += time.perf_counter() - start
+        self.prompt_tokens += response.get("prompt_eval_count") or 0
+        self.completion_tokens += response.get("eval_count") or 0
+        return response["message"]["content"]
+
+    async def chat(self, messages, **kwargs):
+        state = self._state()
+        key = compute_args_hash(MODEL, messages, sorted(kwargs.items()))
+        task = state["inflight"].get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+        task = asyncio.ensure_future(self._call(state, messages, kwargs))
+        state["inflight"][key] = task
+        try:
+            return await asyncio.shield(task)
+        finally:
+            state["inflight"].pop(key, None)
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "mean_latency_s": (
+                round(self.total_seconds / self.calls, 3) if self.calls else 0
+            ),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+
+ollama_pool = OllamaPool()
 
 
 async def ollama_model_if_cache(
@@ -39,7 +145,6 @@ async def ollama_model_if_cache(
     kwargs.pop("max_tokens", None)
     kwargs.pop("response_format", None)
 
-    ollama_client = ollama.AsyncClient()
     messages = []
     if system_prompt:
         messages.append({"role": "system", "content": system_prompt})
@@ -54,9 +159,7 @@ async def ollama_model_if_cache(
         if if_cache_return is not None:
             return if_cache_return["return"]
     # -----------------------------------------------------
-    response = await ollama_client.chat(model=MODEL, messages=messages, **kwargs)
-    print(response)
-    result = response["message"]["content"]
+    result = await ollama_pool.chat(messages, **kwargs)
     # Cache the response if having-------------------
     if hashing_kv is not None:
         await hashing_kv.upsert({args_hash: {"return": result, "model": MODEL}})
@@ -78,30 +181,18 @@ neo4j_config = {
 }
 
 graph_func = GraphRAG(
-    graph_storage_cls=Neo4jStorage,
+    graph_storage_cls=StampedNeo4jStorage,  # Stamps writes for incremental visualization
+    key_string_value_json_storage_cls=SQLiteKVStorage,  # Indexed, no full-file rewrites
+    vector_db_storage_cls=MmapVectorStorage,  # Memory-mapped, append-only vectors
+    embedding_func=graphrag_embedding("./mohs"),  # Cached by content, batched calls
+    embedding_batch_num=256,  # Let the embedding batcher see whole upserts
     addon_params=neo4j_config,
     working_dir="./mohs",  # Can reload faster
 )
 
-import asyncio
-
-
-# To insert it into the knowledge graph and visualize
-# def insert_and_visualize(path, vis_output):
-#     with open(path) as f:
-#         graph_func.insert(f.read())
-#     visualize_neo4j_graph(output_file=vis_output)
-
-
-# with open("transcripts/lita_transcript.txt") as f:
-#     graph_func.insert(f.read())
-#     visualize_neo4j_graph(output_file="three_js/base_graph.html")
-
 
 # Starting REAL-TIME PROCESSING
 
-import time
-
 
 def process_video(video_path, json_folder):
     # Open the video file
@@ -115,6 +206,10 @@ def process_video(video_path, json_folder):
     fps = cap.get(cv2.CAP_PROP_FPS)
     frame_count = 0
 
+    # Inserts the LITA transcript and each transcript_{n}.json once, skipping ingested ones
+    ingestor = TranscriptIngestor(graph_func, json_folder, vis_dir="three_js")
+    timeline = TimelineIndex(graph_func)
+
     while cap.isOpened():
         # Read the next frame
         ret, frame = cap.read()
@@ -132,24 +227,18 @@ def process_video(video_path, json_folder):
         if (
             int(elapsed_time) % 20 == 0 and frame_count % fps == 0
         ):  # On every 20th second
-            # json_file_name = f"transcript_{int(elapsed_time // 20)}.json"
-            # json_file_path = "transcripts/" + json_file_name
-
-            # # Check if the JSON file exists
-            # if os.path.exists(json_file_path):
-            #     vis_file = f"three_js/transcript_{int(elapsed_time // 20)}.html"
-            #     insert_and_visualize(json_file_path, vis_file)
-            #     time.sleep(2)
-            # else:
-            #     print(f"Warning: {json_file_name} not found.")
+            # Ingest any transcript segments that arrived since the last tick
+            ingestor.poll()
+            print(ingestor.stats())
 
             # Query the Database
             query_temp = """
             This is a CLIP from Moh's Cancer surgery. Identify ALL ENTITIES, their ROLES, RELATIONSHIPS, operations, and if ANY cancer treatment guidelines were violated or the patient responded abnormally BY DESCRIBING EACH STEP. FORMAT THIS IN HTML TAGS (<p></p> outermost). Append **** (4 ASTERIKS) at the end if anything was violated.
             """
 
-            # # Perform global graphrag search
-            print(graph_func.query(query_temp))
+            # Search only the current and previous 20 s window
+            window = int(elapsed_time) // 20
+            print(windowed_query(graph_func, timeline, query_temp, window))
 
         # Display the frame (optional)
         cv2.imshow("Video", frame)
@@ -163,8 +252,9 @@ def process_video(video_path, json_folder):
     cv2.destroyAllWindows()
 
 
-video_path = "mohs.mp4"  # Path to your video file
-json_folder = (
-    "/transcripts"  # Folder containing transcript_0.json, transcript_1.json, etc.
-)
-process_video(video_path, json_folder)
+if __name__ == "__main__":
+    video_path = "mohs.mp4"  # Path to your video file
+    json_folder = (
+        "transcripts"  # Folder containing transcript_0.json, transcript_1.json, etc.
+    )
+    process_video(video_path, json_folder)
@@ -1,3 +1,11 @@
+import atexit
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from nano_graphrag._storage import Neo4jStorage
 from neo4j import GraphDatabase
 from neo4j.graph import Node, Relationship, Path
 import networkx as nx
@@ -12,76 +20,221 @@ query = """
 MATCH p=()-->() RETURN p;
 """
 output_file = "test.html"
+label = "___mohs__chunk_entity_relation"  # Neo4jStorage's node label for working_dir="./mohs"
 
+WATERMARK = "updated_at"  # Set on every node/relationship write by StampedNeo4jStorage
+RELATION = "RELATED"  # The only relationship type Neo4jStorage writes
+FETCH_SIZE = 1000  # Records pulled from the server per batch while streaming
 
-def visualize_neo4j_graph(
-    uri=uri, user=user, password=password, query=query, output_file=output_file
-):
-    """Visualizes a graph from Neo4j query results and saves it as an HTML file using pyvis."""
-
-    def graph_from_cypher(data):
-        """Constructs a networkx graph from the results of a neo4j cypher query.
-        Nodes have fields 'labels' (frozenset) and 'properties' (dicts). Node IDs correspond to the neo4j graph.
-        Edges have fields 'type_' (string) denoting the type of relation, and 'properties' (dict).
-        """
-        G = nx.MultiDiGraph()
-
-        def add_node(node):
-            u = node.element_id
-            if G.has_node(u):
-                return
-            G.add_node(u, labels=node._labels, properties=dict(node))
-
-        def add_edge(relation):
-            for node in (relation.start_node, relation.end_node):
-                add_node(node)
-            u = relation.start_node.element_id
-            v = relation.end_node.element_id
-            eid = relation.element_id
-            if G.has_edge(u, v, key=eid):
-                return
-            G.add_edge(u, v, key=eid, type_=relation.type, properties=dict(relation))
-
-        def handle_path(path):
-            for node in path.nodes:
+# Every node and relationship exactly once, instead of once per path through it
+DISTINCT_QUERIES = ("MATCH (n) RETURN n", "MATCH ()-[r]->() RETURN r")
+
+
+class StampedNeo4jStorage(Neo4jStorage):
+    """Neo4jStorage that stamps each upserted node and relationship with updated_at.
+
+    GraphSnapshot uses the stamp as a watermark to fetch only what changed;
+    both stamps are indexed so that stays proportional to the changes.
+    """
+
+    async def index_start_callback(self):
+        await super().index_start_callback()
+        async with self.async_driver.session() as session:
+            await session.run(
+                f"CREATE INDEX IF NOT EXISTS FOR (n:`{self.namespace}`) ON (n.{WATERMARK})"
+            )
+            await session.run(
+                f"CREATE INDEX IF NOT EXISTS FOR ()-[r:{RELATION}]-() ON (r.{WATERMARK})"
+            )
+
+    async def nodes_from_chunks(self, chunk_ids):
+        """(id, source_id) of every node extracted from any of chunk_ids."""
+        async with self.async_driver.session() as session:
+            result = await session.run(
+                f"MATCH (n:`{self.namespace}`) "
+                "WHERE any(c IN $chunk_ids WHERE n.source_id CONTAINS c) "
+                "RETURN n.id AS id, n.source_id AS source_id",
+                chunk_ids=list(chunk_ids),
+            )
+            return [(record["id"], record["source_id"]) async for record in result]
+
+    async def upsert_node(self, node_id, node_data):
+        await super().upsert_node(node_id, {**node_data, WATERMARK: time.time()})
+
+    async def upsert_edge(self, source_node_id, target_node_id, edge_data):
+        await super().upsert_edge(
+            source_node_id, target_node_id, {**edge_data, WATERMARK: time.time()}
+        )
+
+
+_drivers = {}
+_drivers_lock = threading.Lock()
+
+
+def get_driver(uri=uri, user=user, password=password):
+    """Returns a long-lived driver (with its own connection pool) per uri and user."""
+    with _drivers_lock:
+        driver = _drivers.get((uri, user))
+        if driver is None:
+            driver = GraphDatabase.driver(uri, auth=(user, password))
+            _drivers[(uri, user)] = driver
+        return driver
+
+
+@atexit.register
+def close_drivers():
+    with _drivers_lock:
+        for driver in _drivers.values():
+            driver.close()
+        _drivers.clear()
+
+
+def graph_from_cypher(data, G=None):
+    """Constructs a networkx graph from the results of a neo4j cypher query.
+    Nodes have fields 'labels' (frozenset) and 'properties' (dicts). Node IDs correspond to the neo4j graph.
+    Edges have fields 'type_' (string) denoting the type of relation, and 'properties' (dict).
+    data may be a lazy result; records are consumed one at a time and each node or edge
+    is added once, however many paths it appears in. Pass G to update an existing graph.
+    """
+    G = nx.MultiDiGraph() if G is None else G
+    seen = set()  # element_ids added by this call
+
+    def add_node(node):
+        u = node.element_id
+        if u in seen:
+            return
+        seen.add(u)
+        G.add_node(u, labels=node._labels, properties=dict(node))
+
+    def add_edge(relation):
+        eid = relation.element_id
+        if eid in seen:
+            return
+        seen.add(eid)
+        for node in (relation.start_node, relation.end_node):
+            # A relationship returned on its own carries bare endpoint nodes
+            if not G.has_node(node.element_id):
                 add_node(node)
-            for rel in path.relationships:
-                add_edge(rel)
-
-        for d in data:
-            for entry in d.values():
-                if isinstance(entry, Node):
-                    add_node(entry)
-                elif isinstance(entry, Relationship):
-                    add_edge(entry)
-                elif isinstance(entry, Path):
-                    handle_path(entry)
-                else:
-                    raise TypeError(f"Unrecognized object: {entry}")
-
-        return G
-
-    def serialize_node_labels(G):
-        for node, data in G.nodes(data=True):
-            if "labels" in data and isinstance(data["labels"], frozenset):
-                data["labels"] = list(data["labels"])  # Convert frozenset to list
-
-    def serialize_edge_properties(G):
-        for u, v, k, data in G.edges(data=True, keys=True):
-            for key, value in data.items():
-                if isinstance(value, frozenset):
-                    data[key] = list(value)  # Convert frozenset to list
-
-    # Connect to Neo4j
-    driver = GraphDatabase.driver(uri, auth=(user, password))
-
-    with driver.session() as session:
-        # First, consume the result into a list
-        data = list(session.run(query))
-
-    # Now, you can safely pass it to the function
-    G = graph_from_cypher(data)
+        u = relation.start_node.element_id
+        v = relation.end_node.element_id
+        G.add_edge(u, v, key=eid, type_=relation.type, properties=dict(relation))
+
+    def handle_path(path):
+        for node in path.nodes:
+            add_node(node)
+        for rel in path.relationships:
+            add_edge(rel)
+
+    for d in data:
+        for entry in d.values():
+            if isinstance(entry, Node):
+                add_node(entry)
+            elif isinstance(entry, Relationship):
+                add_edge(entry)
+            elif isinstance(entry, Path):
+                handle_path(entry)
+            else:
+                raise TypeError(f"Unrecognized object: {entry}")
+
+    return G
+
 
+def stream_graph(driver, queries=DISTINCT_QUERIES, G=None, fetch_size=FETCH_SIZE, **params):
+    """Builds a graph from each query's records as they arrive, fetch_size at a time."""
+    G = nx.MultiDiGraph() if G is None else G
+    with driver.session(fetch_size=fetch_size) as session:
+        for cypher in queries:
+            graph_from_cypher(session.run(cypher, **params), G)
+    return G
+
+
+_UNSEEN = object()
+
+
+class GraphSnapshot:
+    """Local copy of the Neo4j graph, kept current by fetching only what changed.
+
+    The first refresh loads everything; later ones fetch nodes and
+    relationships stamped at or after the watermark, minus a few seconds of
+    overlap since stamps are taken before the write commits. Records whose
+    stamp was already seen are skipped. Deletions are not tracked; call
+    refresh(full=True) to resync. Pass the storage's node label so the
+    incremental queries can use StampedNeo4jStorage's watermark indexes.
+    """
+
+    overlap = 5.0
+
+    def __init__(self, driver, label=None):
+        self.driver = driver
+        self.match = f"(n:`{label}`)" if label else "(n)"
+        self.graph = nx.MultiDiGraph()
+        self.since = None
+        self.version = 0  # Bumped whenever a refresh changes something
+        self._stamps = {}  # element_id -> last seen stamp
+        self._lock = threading.Lock()
+
+    def _changed(self, records):
+        """Passes through records holding anything not seen with its current stamp."""
+        for record in records:
+            new = False
+            for value in record.values():
+                stamp = value.get(WATERMARK)
+                if self._stamps.get(value.element_id, _UNSEEN) == stamp:
+                    continue
+                self._stamps[value.element_id] = stamp
+                new = True
+                if stamp is not None:
+                    self.since = max(self.since, stamp)
+            if new:
+                self.changed += 1
+                yield record
+
+    def _fetch(self, session, cypher, **params):
+        graph_from_cypher(self._changed(session.run(cypher, **params)), self.graph)
+
+    def refresh(self, full=False):
+        """Pulls changes from Neo4j; returns the number of changed records."""
+        # Nodes first, so relationships can be fetched on their own without endpoints
+        with self._lock, self.driver.session(fetch_size=FETCH_SIZE) as session:
+            self.changed = 0
+            if full or self.since is None:
+                self.graph = nx.MultiDiGraph()
+                self._stamps = {}
+                self.since = time.time()
+                self._fetch(session, f"MATCH {self.match} RETURN n")
+                self._fetch(session, f"MATCH {self.match}-[r]->() RETURN r")
+            else:
+                since = self.since - self.overlap
+                self._fetch(
+                    session,
+                    f"MATCH {self.match} WHERE n.{WATERMARK} >= $since RETURN n",
+                    since=since,
+                )
+                self._fetch(
+                    session,
+                    f"MATCH {self.match}-[r:{RELATION}]->() WHERE r.{WATERMARK} >= $since RETURN r",
+                    since=since,
+                )
+            if self.changed:
+                self.version += 1
+            return self.changed
+
+
+def serialize_node_labels(G):
+    for node, data in G.nodes(data=True):
+        if "labels" in data and isinstance(data["labels"], frozenset):
+            data["labels"] = list(data["labels"])  # Convert frozenset to list
+
+
+def serialize_edge_properties(G):
+    for u, v, k, data in G.edges(data=True, keys=True):
+        for key, value in data.items():
+            if isinstance(value, frozenset):
+                data[key] = list(value)  # Convert frozenset to list
+
+
+def render_graph(G, output_file):
+    """Writes G as a pyvis HTML page."""
     # Convert the frozenset to a string or list in the NetworkX graph before using Pyvis
     serialize_node_labels(G)
     serialize_edge_properties(G)
@@ -130,8 +283,64 @@ def visualize_neo4j_graph(
     net.save_graph(output_file)
     print(f"Graph visualization saved to {output_file}")
 
-    # Close the Neo4j driver
-    driver.close()
+
+_snapshots = {}
+_rendered = {}  # (uri, user, label) -> (snapshot version, last output file)
+
+
+def visualize_neo4j_graph(
+    uri=uri,
+    user=user,
+    password=password,
+    query=query,
+    output_file=output_file,
+    label=label,
+):
+    """Visualizes a graph from Neo4j query results and saves it as an HTML file using pyvis.
+
+    With the default query the graph comes from an incrementally refreshed
+    snapshot and is only re-rendered when something changed; otherwise the
+    last render is copied to output_file. Any other query (or list of
+    queries, e.g. DISTINCT_QUERIES) is streamed into a fresh graph. label is
+    the storage's node label (graph_func.chunk_entity_relation_graph.namespace).
+    """
+    driver = get_driver(uri, user, password)
+    if query != globals()["query"]:
+        queries = [query] if isinstance(query, str) else query
+        render_graph(stream_graph(driver, queries), output_file)
+        return
+
+    key = (uri, user, label)
+    with _drivers_lock:
+        snapshot = _snapshots.get(key)
+        if snapshot is None:
+            snapshot = _snapshots[key] = GraphSnapshot(driver, label)
+    snapshot.refresh()
+    version, last_file = _rendered.get(key, (None, None))
+    if version == snapshot.version and last_file and os.path.exists(last_file):
+        if os.path.abspath(last_file) != os.path.abspath(output_file):
+            shutil.copyfile(last_file, output_file)
+        return
+    render_graph(snapshot.graph, output_file)
+    _rendered[key] = (snapshot.version, output_file)
+
+
+_render_executor = ThreadPoolExecutor(max_workers=1)
+_pending_render = None
+_pending_lock = threading.Lock()
+
+
+def visualize_in_background(**kwargs):
+    """Queues visualize_neo4j_graph on a worker thread so callers never block.
+
+    A render still waiting to start is replaced by the newer request.
+    """
+    global _pending_render
+    with _pending_lock:
+        if _pending_render is not None:
+            _pending_render.cancel()  # No-op once it is running
+        _pending_render = _render_executor.submit(visualize_neo4j_graph, **kwargs)
+        return _pending_render
 
 
 # Call the function
@@ -8,8 +8,11 @@ Created on Sat Feb 10 19:08:03 2024
 import matplotlib.pyplot as plt
 from sklearn.decomposition import PCA
 import pandas as pd
+import sys
+sys.path.append('../data')
+from pipeline import load
 
-clean_df = pd.read_csv('clusters_added_clean_data_revised.csv')
+clean_df = load('clusters')
 features_for_pca = clean_df.drop(columns=['Cluster_Labels', 'Company_Name', 'Ticker', 'Company_Name_Encoded', 'Industry_Encoded'])
 
 # Initialize PCA for 2D reduction
@@ -11,11 +11,14 @@ from scipy.cluster.hierarchy import dendrogram, linkage
 from sklearn.cluster import AgglomerativeClustering
 from sklearn.decomposition import PCA
 import numpy as np
+import sys
+sys.path.append('../data')
+from pipeline import load
 
 #print(df.head())
 #print(df.columns)
 
-df = pd.read_csv('final_dataset_normalized.csv')
+df = load('final_dataset_normalized')  # feather artifact, rebuilt if the CSV changed
 clean_df = df.drop(columns=['Company_Name', 'Ticker', 'Market Cap Normalized', 'Industry_Encoded', 'Company_Name_Encoded'])
 #print(clean_df.columns)
 #print(clean_df.iloc)
@@ -0,0 +1,127 @@
+import re
+import sys
+import time
+
+import numpy as np
+from scipy import sparse
+
+try:
+    from rapidfuzz import fuzz
+except ImportError:  # fuzzywuzzy has the same scorers, just slower
+    from fuzzywuzzy import fuzz
+
+# Company-name matching against the NASDAQ screener.
+# Instead of running extractOne over every NASDAQ name for every company, names are
+# normalized, split into character trigrams and put in a sparse matrix. One sparse
+# product gives every query's shared-trigram counts with every name, the best few
+# candidates per query are kept (blocking), and only those get the WRatio score.
+
+SUFFIXES = [
+    'common stock', 'ordinary shares', 'depositary shares', 'common shares',
+    'class a', 'class b', 'warrants?', 'units?',
+    'incorporated', 'inc', 'corporation', 'corp', 'company', 'co', 'llc',
+    'ltd', 'limited', 'plc', 'holdings?', 'group', 'the',
+]
+SUFFIX_PATTERN = re.compile(r'\b(?:' + '|'.join(SUFFIXES) + r')\b')
+PUNCTUATION = re.compile(r'[^a-z0-9& ]+')
+
+
+def normalize(name):
+    name = PUNCTUATION.sub(' ', str(name).lower().replace('&', ' & '))
+    name = SUFFIX_PATTERN.sub(' ', name)
+    return ' '.join(name.split())
+
+
+def trigrams(name):
+    padded = f'  {name} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameMatcher:
+    def __init__(self, names, tickers):
+        self.names = list(names)
+        self.tickers = list(tickers)
+        self.normalized = [normalize(n) for n in self.names]
+        self.vocab = {}
+        self.matrix = self._vectorize(self.normalized, grow=True)
+        self.sizes = np.asarray(self.matrix.sum(axis=1)).ravel()
+        # Exact normalized-name lookups skip scoring entirely
+        self.exact = {}
+        for i, norm in enumerate(self.normalized):
+            self.exact.setdefault(norm, i)
+        self.stats = {}
+
+    def _vectorize(self, names, grow=False):
+        rows, cols = [], []
+        for row, name in enumerate(names):
+            for gram in trigrams(name):
+                col = self.vocab.get(gram)
+                if col is None:
+                    if not grow:
+                        continue
+                    col = self.vocab[gram] = len(self.vocab)
+                rows.append(row)
+                cols.append(col)
+        data = np.ones(len(rows), dtype=np.float32)
+        return sparse.csr_matrix((data, (rows, cols)), shape=(len(names), len(self.vocab)))
+
+    def candidates(self, queries, k=10, chunk=512):
+        # Top k names per query by trigram Dice similarity
+        q_matrix = self._vectorize(queries)
+        q_sizes = np.array([len(trigrams(q)) for q in queries], dtype=np.float32)
+        names_t = self.matrix.T.tocsc()
+        k = min(k, len(self.names))
+        for start in range(0, len(queries), chunk):
+            shared = (q_matrix[start:start + chunk] @ names_t).toarray()
+            dice = 2 * shared / (q_sizes[start:start + chunk, None] + self.sizes[None, :])
+            top = np.argpartition(-dice, k - 1, axis=1)[:, :k]
+            for row, cols in enumerate(top):
+                yield [c for c in cols if shared[row, c] > 0]
+
+    def match(self, queries, threshold=85, k=10):
+        # Returns {query: (ticker, matched name, score)} for queries scoring >= threshold
+        start = time.perf_counter()
+        normalized = [normalize(q) for q in queries]
+        results, pending = {}, []
+        for query, norm in zip(queries, normalized):
+            if norm in self.exact:
+                i = self.exact[norm]
+                results[query] = (self.tickers[i], self.names[i], 100.0)
+            elif norm:
+                pending.append((query, norm))
+        comparisons = 0
+        candidate_lists = self.candidates([norm for _, norm in pending], k)
+        for (query, norm), cands in zip(pending, candidate_lists):
+            comparisons += len(cands)
+            scored = [(fuzz.WRatio(norm, self.normalized[c]), c) for c in cands]
+            if scored:
+                score, best = max(scored)
+                if score >= threshold:
+                    results[query] = (self.tickers[best], self.names[best], score)
+        seconds = time.perf_counter() - start
+        self.stats = {
+            'queries': len(queries),
+            'matched': len(results),
+            'comparisons': comparisons,
+            'seconds': round(seconds, 3),
+            'names_per_sec': round(len(queries) / seconds, 1) if seconds else 0.0,
+        }
+        return results
+
+    def ticker_map(self, queries, threshold=85, k=10):
+        # Precomputed name -> ticker dict (None where nothing matched well enough)
+        matches = self.match(queries, threshold, k)
+        return {q: matches[q][0] if q in matches else None for q in queries}
+
+
+if __name__ == '__main__':
+    # python name_matching.py [companies.csv] [column]
+    import pandas as pd
+
+    companies_path = sys.argv[1] if len(sys.argv) > 1 else 'clean-environmental-dataset.csv'
+    column = sys.argv[2] if len(sys.argv) > 2 else 'Company_Name'
+    nasdaq = pd.read_csv('nasdaq.csv')
+    matcher = NameMatcher(nasdaq['Name'], nasdaq['Symbol'])
+    companies = pd.read_csv(companies_path)[column].dropna().unique().tolist()
+    ticker_map = matcher.ticker_map(companies)
+    print(matcher.stats)
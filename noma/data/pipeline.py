@@ -0,0 +1,226 @@
+import hashlib
+import json
+import os
+import sys
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+# Build pipeline for the Seed dataset.
+# Every stage is stored as an Arrow/feather file in artifacts/, and is rebuilt only
+# when the content hash of one of its inputs (a source CSV or an upstream stage)
+# or the stage's version changes. Consumers call load(name), which memory-maps
+# the artifact instead of re-parsing CSVs.
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+ARTIFACT_DIR = os.path.join(DATA_DIR, 'artifacts')
+MANIFEST = os.path.join(ARTIFACT_DIR, 'manifest.json')
+CLUSTERING_DIR = os.path.join('..', 'Clustering-Hierarcal')  # Relative to DATA_DIR
+
+STAGES = {}
+
+
+def stage(name, inputs, version=1):
+    # inputs are source file paths (relative to data/) or 'stage:<name>'
+    def register(func):
+        STAGES[name] = {'func': func, 'inputs': inputs, 'version': version}
+        return func
+    return register
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def artifact_path(name):
+    return os.path.join(ARTIFACT_DIR, name + '.feather')
+
+
+def read_manifest():
+    if os.path.exists(MANIFEST):
+        with open(MANIFEST) as f:
+            return json.load(f)
+    return {}
+
+
+def write_manifest(manifest):
+    os.makedirs(ARTIFACT_DIR, exist_ok=True)
+    with open(MANIFEST + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(MANIFEST + '.tmp', MANIFEST)
+
+
+def input_hashes(name, manifest):
+    hashes = {}
+    for source in STAGES[name]['inputs']:
+        if source.startswith('stage:'):
+            hashes[source] = manifest[source[len('stage:'):]]['hash']
+        else:
+            hashes[source] = file_hash(os.path.join(DATA_DIR, source))
+    return hashes
+
+
+def build(name, manifest=None, force=False):
+    # Builds name and its upstream stages if stale; returns True if anything was rebuilt
+    save = manifest is None
+    manifest = read_manifest() if manifest is None else manifest
+    rebuilt = False
+    for source in STAGES[name]['inputs']:
+        if source.startswith('stage:'):
+            rebuilt |= build(source[len('stage:'):], manifest, force)
+
+    spec = STAGES[name]
+    hashes = input_hashes(name, manifest)
+    entry = manifest.get(name)
+    fresh = (
+        entry is not None
+        and entry['inputs'] == hashes
+        and entry['version'] == spec['version']
+        and os.path.exists(artifact_path(name))
+    )
+    if not fresh or force:
+        inputs = [
+            load_table(s[len('stage:'):]).to_pandas() if s.startswith('stage:')
+            else os.path.join(DATA_DIR, s)
+            for s in spec['inputs']
+        ]
+        df = spec['func'](*inputs)
+        os.makedirs(ARTIFACT_DIR, exist_ok=True)
+        # Uncompressed so the file can be memory-mapped as-is
+        feather.write_feather(df, artifact_path(name) + '.tmp', compression='uncompressed')
+        os.replace(artifact_path(name) + '.tmp', artifact_path(name))
+        manifest[name] = {
+            'inputs': hashes,
+            'version': spec['version'],
+            'hash': file_hash(artifact_path(name)),
+            'rows': len(df),
+        }
+        print(f'built {name}: {len(df)} rows')
+        rebuilt = True
+    if save and rebuilt:
+        write_manifest(manifest)  # Untouched on the no-op builds every dashboard rerun does
+    return rebuilt
+
+
+def load_table(name):
+    # Memory-mapped Arrow table; the column buffers point into the file
+    return pa.ipc.open_file(pa.memory_map(artifact_path(name))).read_all()
+
+
+def load(name, build_if_stale=True):
+    if build_if_stale and name in STAGES:
+        build(name)
+    return load_table(name).to_pandas()
+
+
+# ---- Source stages: each CSV is parsed once, then read back from its artifact ----
+
+@stage('environment_w_ticker', ['clean_environment_w_ticker.csv'])
+def environment_w_ticker(path):
+    df = pd.read_csv(path)
+    df['Company_Name'] = df['Company_Name'].str.lower()
+    return df
+
+
+@stage('market_cap', ['cleaned_market_cap_values.csv'])
+def market_cap(path):
+    return pd.read_csv(path)
+
+
+@stage('environmental_no_duplicates', ['cleaned_environmental_dataset_no_duplicates.csv'])
+def environmental_no_duplicates(path):
+    return pd.read_csv(path)
+
+
+@stage('final_dataset_normalized', [os.path.join(CLUSTERING_DIR, 'final_dataset_normalized.csv')])
+def final_dataset_normalized(path):
+    return pd.read_csv(path)
+
+
+@stage('clusters', [os.path.join(CLUSTERING_DIR, 'clusters_added_clean_data_revised.csv')])
+def clusters(path):
+    return pd.read_csv(path)
+
+
+# ---- Derived stages (what sortingnew.py used to do with CSV round trips) ----
+
+@stage('combined', ['stage:environment_w_ticker', 'stage:market_cap'])
+def combined(environment, market):
+    market = market.copy()
+    market['Company_Name'] = market['Company_Name'].str.lower()
+    return pd.merge(environment, market, on='Company_Name', how='outer')
+
+
+@stage('final_combined', ['stage:combined'])
+def final_combined(combined):
+    df = combined.copy()
+    df['ticker'] = df['Ticker_x'].combine_first(df['Ticker_y'])
+    df = df.dropna(subset=['ticker'])
+    return df.drop(columns=['Ticker_x', 'Ticker_y']).reset_index(drop=True)
+
+
+# ---- Analytics stages for seed_streamlit.py, so reruns don't recompute them ----
+
+@stage('sdg_correlation', ['stage:environmental_no_duplicates'])
+def sdg_correlation(data):
+    sdg_columns = [col for col in data.columns if col.startswith('SDG')]
+    return data[sdg_columns].corr().rename_axis('SDG').reset_index()
+
+
+@stage('common_industries', ['stage:environmental_no_duplicates'])
+def common_industries(data):
+    # Rows from industries with more than 5 companies, with '(123)' codes and digits stripped
+    data = data.copy()
+    data['Industry (Exiobase)'] = data['Industry (Exiobase)'].str.replace(r'\(\d+\)', '', regex=True) \
+                                                             .str.replace(r'\d+', '', regex=True) \
+                                                             .str.strip()
+    industry_counts = data['Industry (Exiobase)'].value_counts()
+    common = industry_counts[industry_counts > 5].index
+    return data[data['Industry (Exiobase)'].isin(common)].reset_index()
+
+
+@stage('pca_projection', ['stage:clusters'])
+def pca_projection(clean_df):
+    # One 3-component fit; its first two components are the 2D projection
+    from sklearn.decomposition import PCA
+
+    features = clean_df.drop(columns=['Cluster_Labels', 'Company_Name', 'Ticker', 'Company_Name_Encoded', 'Industry_Encoded'])
+    projected = PCA(n_components=3).fit_transform(features)
+    return pd.DataFrame({
+        'PC1': projected[:, 0],
+        'PC2': projected[:, 1],
+        'PC3': projected[:, 2],
+        'Cluster_Labels': clean_df['Cluster_Labels'],
+    })
+
+
+@stage('ticker_matches', ['clean-environmental-dataset.csv', 'nasdaq.csv'])
+def ticker_matches(companies_path, nasdaq_path):
+    # Company_Name -> NASDAQ ticker via the blocked matcher in name_matching.py
+    # (imported here so the dashboards don't need scipy/rapidfuzz to load artifacts)
+    from name_matching import NameMatcher
+
+    nasdaq = pd.read_csv(nasdaq_path)
+    matcher = NameMatcher(nasdaq['Name'], nasdaq['Symbol'])
+    companies = pd.read_csv(companies_path)['Company_Name'].dropna().unique().tolist()
+    matches = matcher.match(companies)
+    print(matcher.stats)
+    return pd.DataFrame(
+        [(name, *match) for name, match in matches.items()],
+        columns=['Company_Name', 'Ticker', 'Matched_Name', 'Score'],
+    )
+
+
+if __name__ == '__main__':
+    # python pipeline.py [stage ...]   (default: every stage)
+    manifest = read_manifest()
+    names = sys.argv[1:] or list(STAGES)
+    for name in names:
+        if not build(name, manifest):
+            print(f'{name} up to date')
+    write_manifest(manifest)
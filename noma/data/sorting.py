@@ -73,6 +73,8 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 # nasdaq_data['Cleaned_Name'] = nasdaq_data['Name'].apply(clean_company_name)
 # clean_environmental_data['Cleaned_Company_Name'] = clean_environmental_data['Company_Name'].apply(clean_company_name)
 
+# # NOTE: superseded by name_matching.NameMatcher (trigram blocking, scores only candidates);
+# # the results are built as the 'ticker_matches' stage in pipeline.py
 # # Fuzzy match function adjusted for parallel execution
 # def get_ticker_for_company(company_row):
 #     cleaned_company_name = company_row['Cleaned_Company_Name']
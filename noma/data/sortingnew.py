@@ -31,6 +31,7 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 # # Create a mapping of standardized names to NASDAQ symbols
 # name_to_symbol = pd.Series(nasdaq_data.Symbol.values, index=nasdaq_data['Standardized Name']).to_dict()
 
+# # NOTE: superseded by name_matching.NameMatcher; see the 'ticker_matches' stage in pipeline.py
 # # Define a function to perform fuzzy matching
 # def find_best_match(name, choices, scorer=fuzz.WRatio, threshold=85):
 #     best_match = process.extractOne(name, choices, scorer=scorer)
@@ -82,20 +83,10 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # merged_df.to_csv('ticker_environmental.csv')
 
-new_envi_path = 'clean_environment_w_ticker.csv'
-new_envi_data = pd.read_csv(new_envi_path)
-market_path = 'cleaned_market_cap_values.csv'
-market_path_data = pd.read_csv(market_path)
+# The merge now lives in pipeline.py as the 'combined' and 'final_combined' stages,
+# stored as feather artifacts and rebuilt only when the input CSVs change.
+# The CSV is still written for the notebooks that read it.
+from pipeline import load
 
-new_envi_data['Company_Name'] = new_envi_data['Company_Name'].str.lower()
-market_path_data['Company_Name'] = market_path_data['Company_Name'].str.lower()
-
-combined_df = pd.merge(new_envi_data, market_path_data, on='Company_Name', how='outer')
-combined_df.to_csv('combined_dataset.csv')
-
-new_path = 'combined_dataset.csv'
-new_df = pd.read_csv(new_path)
-new_df['ticker'] = new_df['Ticker_x'].combine_first(new_df['Ticker_y'])
-new_df.dropna(subset=['ticker'], inplace=True)
-final_df = new_df.drop(columns=['Ticker_x', 'Ticker_y'])
+final_df = load('final_combined')
 final_df.to_csv('final_combined_dataset.csv')
\ No newline at end of file
@@ -146,7 +146,7 @@ function Dashboard() {
         setIsRefreshing(true)
 
         try {
-            const url = `http://127.0.0.1:5002/func?cntxt=` + ctx + `?new=false`;
+            const url = `http://127.0.0.1:5002/func?cntxt=` + ctx + `&new=false`;
             const response = await fetch(url);
             if (!response.ok) throw new Error('Network response was not ok');
             
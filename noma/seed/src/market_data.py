@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Market data for the /stock and /stocks endpoints.
+# Each kind of data has its own TTL: prices go stale in seconds, company profiles in
+# an hour, ESG scores only change every few days. Concurrent requests for the same
+# (kind, ticker) share one upstream fetch, and batches fetch every ticker in parallel
+# over one pooled HTTP session. Point YAHOO_URL at a local stub server to test offline.
+
+YAHOO_URL = os.environ.get('YAHOO_URL', 'https://query2.finance.yahoo.com')
+HEADERS = {'User-Agent': 'Mozilla/5.0'}  # Yahoo rejects the default requests agent
+
+PRICE_TTL = 60
+PROFILE_TTL = 60 * 60
+ESG_TTL = 3 * 24 * 60 * 60
+
+PROFILE_FIELDS = {
+    'companyName': 'longName',
+    'sector': 'sector',
+    'marketCap': 'marketCap',
+    'forwardPE': 'forwardPE',
+    'dividendYield': 'dividendYield',
+    'averageVolume': 'averageVolume',
+    'peRatio': 'trailingPE',
+    'beta': 'beta',
+    'dividendRate': 'dividendRate',
+    'exDividendDate': 'exDividendDate',
+    'payoutRatio': 'payoutRatio',
+    'fiftyDayAverage': 'fiftyDayAverage',
+    'twoHundredDayAverage': 'twoHundredDayAverage',
+}
+NO_ESG = {'esg': 0, 'gs': 0, 'es': 0, 'ss': 0}
+
+
+def yfinance_profile(ticker):
+    # Fundamentals and news aren't on the public chart endpoint, so these still go through yfinance
+    import yfinance as yf
+
+    stock = yf.Ticker(ticker)
+    info = stock.info
+    profile = {field: info.get(key) for field, key in PROFILE_FIELDS.items()}
+    profile['news'] = stock.news[0:2]
+    return profile
+
+
+class TTLCache:
+    def __init__(self, sweep_interval=60):
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.sweep_interval = sweep_interval
+        self.next_sweep = time.time() + sweep_interval
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.time():
+                return None
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self.lock:
+            self.entries[key] = (now + ttl, value)
+            if now >= self.next_sweep:
+                # Drop expired entries so tickers nobody asks for again don't pile up
+                self.entries = {k: e for k, e in self.entries.items() if e[0] >= now}
+                self.next_sweep = now + self.sweep_interval
+
+
+class MarketData:
+    def __init__(self, base_url=YAHOO_URL, profile_fetcher=yfinance_profile, workers=16,
+                 price_ttl=PRICE_TTL, profile_ttl=PROFILE_TTL, esg_ttl=ESG_TTL, timeout=10):
+        self.base_url = base_url.rstrip('/')
+        self.profile_fetcher = profile_fetcher
+        self.ttl = {'prices': price_ttl, 'profile': profile_ttl, 'esg': esg_ttl}
+        self.timeout = timeout
+        self.http = requests.Session()
+        self.http.headers.update(HEADERS)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=workers)
+        self.http.mount('http://', adapter)
+        self.http.mount('https://', adapter)
+        self.pool = ThreadPoolExecutor(workers)
+        self.cache = TTLCache()
+        self.inflight = {}  # (kind, ticker) -> Future of the fetch in progress
+        self.inflight_lock = threading.Lock()
+        self.stats = {'hits': 0, 'fetches': 0, 'coalesced': 0}
+
+    def _get_json(self, path, **params):
+        response = self.http.get(self.base_url + path, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def fetch_prices(self, ticker):
+        chart = self._get_json(f'/v8/finance/chart/{ticker}', range='1mo', interval='1d')
+        result = chart['chart']['result'][0]
+        meta = result['meta']
+        quote = result['indicators']['quote'][0]
+        closes = [c for c in quote['close'] if c is not None][-6:]
+        opens = [o for o in quote['open'] if o is not None]
+        # meta's chartPreviousClose is the close before the whole range, not yesterday's
+        previous_close = meta.get('previousClose', closes[-2] if len(closes) > 1 else None)
+        prices = {
+            'symbol': meta.get('symbol', ticker),
+            'currentPrice': meta.get('regularMarketPrice'),
+            '52WeekLow': meta.get('fiftyTwoWeekLow'),
+            '52WeekHigh': meta.get('fiftyTwoWeekHigh'),
+            'openPrice': opens[-1] if opens else None,
+            'previousClose': previous_close,
+            'volume': meta.get('regularMarketVolume'),
+        }
+        # day0 is the oldest of the last six closes, day5 the latest
+        for i, close in enumerate(closes):
+            prices[f'day{i + 6 - len(closes)}'] = float(close)
+        return prices
+
+    def fetch_esg(self, ticker):
+        data = self._get_json('/v1/finance/esgChart', symbol=ticker)
+        try:
+            latest = data['esgChart']['result'][0]['symbolSeries']
+            # symbolSeries is column-oriented; the last entry is the latest score
+            return {
+                'esg': float(latest['esgScore'][-1]),
+                'gs': float(latest['governanceScore'][-1]),
+                'es': float(latest['environmentScore'][-1]),
+                'ss': float(latest['socialScore'][-1]),
+            }
+        except (KeyError, IndexError, TypeError, ValueError):
+            return dict(NO_ESG)  # No ESG coverage for this ticker; cached like a real score
+
+    def get(self, kind, ticker):
+        key = (kind, ticker)
+        value = self.cache.get(key)
+        with self.inflight_lock:
+            if value is not None:
+                self.stats['hits'] += 1
+                return value
+            future = self.inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self.inflight[key] = Future()
+                self.stats['fetches'] += 1
+            else:
+                self.stats['coalesced'] += 1
+        if not owner:
+            return future.result()
+        try:
+            fetch = {'prices': self.fetch_prices, 'esg': self.fetch_esg, 'profile': self.profile_fetcher}[kind]
+            value = fetch(ticker)
+            self.cache.set(key, value, self.ttl[kind])
+            future.set_result(value)
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self.inflight_lock:
+                del self.inflight[key]
+        return future.result()
+
+    def stocks(self, tickers):
+        # {ticker: info} for every ticker, fetching all of their data in parallel
+        tickers = list(dict.fromkeys(t.strip().upper() for t in tickers if t.strip()))
+        futures = {
+            (kind, t): self.pool.submit(self.get, kind, t)
+            for t in tickers for kind in ('prices', 'profile', 'esg')
+        }
+        results = {}
+        for t in tickers:
+            try:
+                info = {**futures['profile', t].result(), **futures['prices', t].result()}
+            except Exception as e:
+                results[t] = {'symbol': t, 'error': str(e)}
+                continue
+            try:
+                info.update(futures['esg', t].result())
+            except Exception:
+                info.update(NO_ESG)  # Not cached, so the next request tries again
+            results[t] = info
+        return results
+
+    def stock(self, ticker):
+        return self.stocks([ticker])[ticker.strip().upper()]
@@ -0,0 +1,133 @@
+import asyncio
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import aiohttp
+import openai
+
+# Chat backend for /func.
+# Completions run on one background asyncio loop that owns a pooled aiohttp session,
+# so requests reuse connections instead of opening a client each. The Flask worker
+# waits for the whole reply, which has to parse as JSON; a malformed one is retried.
+# Conversations live in a small SQLite table, one row per message, so a turn is two
+# inserts instead of re-pickling the whole history into the Flask session; the
+# session itself only holds the chat id. Prompts include as many recent messages as
+# fit in HISTORY_TOKENS.
+
+MODEL = 'gpt-4'
+HISTORY_TOKENS = 2000
+MAX_ATTEMPTS = 2  # The first reply plus one retry when it isn't valid JSON
+RETRY_PROMPT = 'That was not valid JSON. Reply with only the JSON object described in the instructions.'
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chats.sqlite')
+
+SYSTEM_PROMPT = "You are an AI assistant tasked with helping users build investment portfolios centered around responsible and sustainable companies. Your role is to analyze users' social goals and generate a tailored sample portfolio comprising 5 to 6 companies that align with those goals. The output must strictly adhere to the following format and guidelines:\n\n1. **Output Format**: Present the portfolio as JSON data. The JSON object should include an array of companies, where each company is represented as an object with two attributes: `ticker` (the company's stock ticker symbol) and `percentage` (the proportion of the portfolio allocated to this company, expressed as a percentage). \n\n2. **Justification**: After the list of companies, include a `justification` field within the JSON object. This field should contain a brief explanation detailing why each company was selected, emphasizing their alignment with the specified social goal.\n\n3. **Constraints**:\n   - The total percentage across all companies should sum to 100%.\n   - Only include company tickers and their respective portfolio percentages in the list of companies.\n   - Ensure the justification provides a clear connection between the companies chosen and the user's social goal.\n\n4. **Example Output Structure**:\n```json\n{\n  \"portfolio\": [\n    {\"ticker\": \"XXXX\", \"percentage\": 20},\n    {\"ticker\": \"YYYY\", \"percentage\": 20},\n    {\"ticker\": \"ZZZZ\", \"percentage\": 20},\n    {\"ticker\": \"AAAA\", \"percentage\": 20},\n    {\"ticker\": \"BBBB\", \"percentage\": 20}\n  ],\n  \"justification\": \"Each company selected for this portfolio focuses on [specific social goal], making them ideal for a responsible and sustainable investment strategy. [Brief explanation of each company's relevance].\"\n}\n```\n\nEnsure your response contains no additional text or data outside of this JSON structure. Your goal is to provide a concise, clear, and informative portfolio recommendation that aligns with the user's social objectives, formatted for easy integration and further analysis."
+
+try:
+    import tiktoken
+    _encoding = tiktoken.encoding_for_model(MODEL)
+
+    def count_tokens(text):
+        return len(_encoding.encode(text))
+except ImportError:
+    def count_tokens(text):
+        return len(text) // 4 + 1  # Rough estimate for English text
+
+
+class ChatStore:
+    def __init__(self, path=DB_PATH):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.db:
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS messages ('
+                'id INTEGER PRIMARY KEY, chat_id TEXT, role TEXT, content TEXT, tokens INTEGER, created REAL)'
+            )
+            self.db.execute('CREATE INDEX IF NOT EXISTS messages_chat ON messages (chat_id, id)')
+
+    def history(self, chat_id, budget=HISTORY_TOKENS):
+        # Most recent messages whose token counts add up to at most budget, oldest first
+        with self.lock:
+            rows = self.db.execute(
+                'SELECT role, content, tokens FROM messages WHERE chat_id = ? ORDER BY id DESC',
+                (chat_id,),
+            )
+            messages, used = [], 0
+            for role, content, tokens in rows:
+                if used + tokens > budget:
+                    break
+                used += tokens
+                messages.append({'role': role, 'content': content})
+        messages.reverse()
+        # Never start on a dangling assistant reply
+        while messages and messages[0]['role'] != 'user':
+            messages.pop(0)
+        return messages
+
+    def append(self, chat_id, *messages):
+        now = time.time()
+        with self.lock, self.db:
+            self.db.executemany(
+                'INSERT INTO messages (chat_id, role, content, tokens, created) VALUES (?, ?, ?, ?, ?)',
+                [(chat_id, m['role'], m['content'], count_tokens(m['content']), now) for m in messages],
+            )
+
+
+class PortfolioChat:
+    def __init__(self, store=None, model=MODEL, max_connections=20):
+        self.store = store or ChatStore()
+        self.model = model
+        self.max_connections = max_connections
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.http = asyncio.run_coroutine_threadsafe(self._open_session(), self.loop).result()
+        atexit.register(self.close)
+
+    async def _open_session(self):
+        return aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.max_connections))
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.http.close(), self.loop).result(timeout=5)
+
+    @staticmethod
+    def new_chat():
+        return uuid.uuid4().hex
+
+    async def _complete(self, messages):
+        openai.aiosession.set(self.http)  # Per task, so every call reuses the pool
+        response = await openai.ChatCompletion.acreate(
+            model=self.model,
+            messages=messages,
+            temperature=0.7,
+            max_tokens=300,
+        )
+        return response.choices[0].message.content.strip()
+
+    def _generate(self, messages):
+        return asyncio.run_coroutine_threadsafe(self._complete(messages), self.loop).result()
+
+    def reply(self, chat_id, cntxt):
+        # Returns the portfolio JSON text, retrying once if the model's reply doesn't parse
+        user_message = {'role': 'user', 'content': cntxt}
+        messages = [{'role': 'system', 'content': SYSTEM_PROMPT}]
+        messages += self.store.history(chat_id) + [user_message]
+        for attempt in range(MAX_ATTEMPTS):
+            reply = self._generate(messages)
+            try:
+                json.loads(reply)
+            except ValueError:
+                print(f'Non-JSON reply (attempt {attempt + 1}):', reply[:200])
+                # The correction stays out of the stored history
+                messages = messages + [
+                    {'role': 'assistant', 'content': reply},
+                    {'role': 'user', 'content': RETRY_PROMPT},
+                ]
+                continue
+            self.store.append(chat_id, user_message, {'role': 'assistant', 'content': reply})
+            return reply
+        raise ValueError(f'No valid portfolio JSON after {MAX_ATTEMPTS} attempts')
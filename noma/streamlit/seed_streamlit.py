@@ -1,14 +1,39 @@
 import streamlit as st
 import seaborn as sns
 import matplotlib.pyplot as plt
-import pandas as pd
-import numpy as np
 from mpl_toolkits.mplot3d import Axes3D
-from sklearn.decomposition import PCA
+import hashlib
+import inspect
+import io
+import sys
+sys.path.append('../data')
+from pipeline import build, load, read_manifest  # Memory-mapped feather artifacts instead of CSVs
+
+# Tables are memoized on their artifact hash and figures are cached as PNGs (also on disk),
+# so a rerun only re-hashes the source files and redraws nothing unless the data changed.
+
+def artifact_hash(name):
+    build(name)  # No-op unless an input changed
+    return read_manifest()[name]['hash']
+
+@st.cache_resource(show_spinner=False)
+def cached_table(name, artifact_hash):
+    return load(name, build_if_stale=False)
+
+@st.cache_data(persist='disk', show_spinner=False)
+def render_png(figure, source_hash, name, artifact_hash, _draw):
+    fig = _draw(cached_table(name, artifact_hash))
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', bbox_inches='tight')  # What st.pyplot used
+    plt.close(fig)
+    return buffer.getvalue()
+
+def show_figure(name, draw):
+    # draw(table) -> matplotlib figure; only called when the cached image is missing or stale.
+    # The key includes draw's source, so editing a plot invalidates its images on disk
+    source_hash = hashlib.sha256(inspect.getsource(draw).encode()).hexdigest()
+    st.image(render_png(draw.__name__, source_hash, name, artifact_hash(name), draw))
 
-st.set_option('deprecation.showPyplotGlobalUse', False)
-
-clean_environmental_dataset = '../data/cleaned_environmental_dataset_no_duplicates.csv'
 # st.image("./seed_logo.png", width=100)
 st.title("Seed: Returns Meet Responsibility")
 st.write("Authors: Unnathi Kumar, Adhira Choudhury, Abhishek Pillai, Neil Goyal")
@@ -28,15 +53,13 @@ st.write("Combining these datasets entailed matching entities by ticker values,
 # SDG Analysis
 st.header("Analysis on SDG (Sustainable Development Goals) Performance")
 st.write("First, we conducted an analysis on the relationships between the different SDG metrics from the HBS dataset.")
-data = pd.read_csv(clean_environmental_dataset)
-
-sdg_columns = [col for col in data.columns if col.startswith('SDG')]
-sdg_data = data[sdg_columns]
-correlation_matrix = sdg_data.corr()
-fig = plt.figure(figsize=(12, 10))
-sns.heatmap(correlation_matrix, annot=True, cmap='coolwarm', fmt=".2f")
-plt.title('Correlation between Different SDG Metrics')
-st.pyplot(fig)
+def sdg_heatmap(correlation_matrix):
+    fig = plt.figure(figsize=(12, 10))
+    sns.heatmap(correlation_matrix.set_index('SDG'), annot=True, cmap='coolwarm', fmt=".2f")
+    plt.title('Correlation between Different SDG Metrics')
+    return fig
+
+show_figure('sdg_correlation', sdg_heatmap)
 st.write('The heatmap above provides some interesting insights. We find that there are a variety of relations within SDG performance, ranging from strongly positively correlated to strongly negatively correlated. For example, SDG 1.5 has a very high correlation with SDG 2.1, 2.2, 2.3, and 2.4 (all 0.99), which means that companies focusing on building resilience to disasters (SDG 1.5) also have a strong focus on eliminating hunger (since SDG 2 is “zero hunger”).')
 st.write('On the contrary, we also find that SDG 14.1 has a strong negative correlation with SDG 3.4 (-0.96) and SDG 3.3 (-0.96), which means that companies focusing on reducing marine pollution (SDG 14.1), generally, do not fight diseases and promote mental health (SDGs 3.3 and 3.4). While this correlation seems unexpected, it is an observed tradeoff that companies should be mindful of and work towards mitigating. SDG 15.1 and SDG 15.2 are perfectly negatively correlated with SDG 14.1 and SDG 14.c, which suggests a tradeoff between conserving life on land versus life on water for companies.')
 st.write('Some moderate correlations are also present in the heatmap. For example, SDG 3.4 shows very little to no linear correlation with SDG 6 (-0.09). so companies focusing on reducing mortality from non-communicable diseases are not necessarily focused on clean water and sanitation.')
@@ -44,28 +67,20 @@ st.write('Some moderate correlations are also present in the heatmap. For exampl
 # Industry Analysis
 st.header("Industry Analysis")
 st.write("We plotted the environmental index in the most common industries (corresponding to more than 5 companies in our dataset) to find trends in environmental indices and assess distribution across sectors.")
-data['Industry (Exiobase)'] = data['Industry (Exiobase)'].str.replace('\(\d+\)', '', regex=True) \
-                                                                 .str.replace('\d+', '', regex=True) \
-                                                                 .str.strip()  # Remove leading/trailing spaces
-
-industry_counts = data['Industry (Exiobase)'].value_counts()
-
-industries_more_than_10 = industry_counts[industry_counts > 5].index
-data_filtered = data[data['Industry (Exiobase)'].isin(industries_more_than_10)]
-data_filtered_reset_index = data_filtered.reset_index()
-
 sns.set(style="whitegrid")
 
-fig2 = plt.figure(figsize=(10, 8))
-s2 = sns.scatterplot(x='Industry (Exiobase)', y='Environmental Index', data=data_filtered_reset_index, hue="Industry (Exiobase)", legend=False)
+def industry_scatter(data_filtered):
+    fig2 = plt.figure(figsize=(10, 8))
+    s2 = sns.scatterplot(x='Industry (Exiobase)', y='Environmental Index', data=data_filtered, hue="Industry (Exiobase)", legend=False)
 
-s2.set(xticklabels=[])
-plt.title('Environmental Index across Different Industries')
-plt.xlabel('Industry')
-plt.ylabel('Environmental Index')
-plt.tight_layout() 
+    s2.set(xticklabels=[])
+    plt.title('Environmental Index across Different Industries')
+    plt.xlabel('Industry')
+    plt.ylabel('Environmental Index')
+    plt.tight_layout()
+    return fig2
 
-st.pyplot(fig2)
+show_figure('common_industries', industry_scatter)
 # st.image('./company_legend.png')
 st.write("With respect to the environmental performance of different industries, we found that generally, companies in the air transport, construction, extraction of crude petroleum, and retail trade spaces have low environmental indices, whereas companies in the research and development and computer spaces have high environmental indices. On the other hand, there is considerable variance in environmental indices in fields like financial intermediation and chemicals. With that, this highlights the need for companies in certain spaces to identify gaps in their methodologies and employ sustainable remedies.")
 
@@ -73,29 +88,32 @@ st.write("With respect to the environmental performance of different industries,
 st.header("Environmental Index vs. Environmental Factors")
 st.markdown("#### Biodiversity")
 
-fig3 = plt.figure(figsize=(14, 10))
-sns.scatterplot(x='Biodiversity', y='Environmental Index', data=data_filtered, alpha = 0.7, s=100)
-plt.title('Environmental Index as a Function of Biodiversity', fontsize=16)
-plt.xlabel('Biodiversity', fontsize=14)
-plt.ylabel('Environmental Index', fontsize=14)
-plt.tight_layout()
-st.pyplot(fig3)
+def biodiversity_scatter(data_filtered):
+    fig3 = plt.figure(figsize=(14, 10))
+    sns.scatterplot(x='Biodiversity', y='Environmental Index', data=data_filtered, alpha = 0.7, s=100)
+    plt.title('Environmental Index as a Function of Biodiversity', fontsize=16)
+    plt.xlabel('Biodiversity', fontsize=14)
+    plt.ylabel('Environmental Index', fontsize=14)
+    plt.tight_layout()
+    return fig3
+
+show_figure('common_industries', biodiversity_scatter)
 
 st.markdown("#### Abiotic Resources")
-fig4 = plt.figure(figsize=(14, 10))
 
-data_filtered2 = data_filtered[data_filtered['Abiotic Resources'] >= 0.98]
-sns.scatterplot(x='Abiotic Resources', y='Environmental Index', data=data_filtered2, alpha = 0.7, s=100)
-plt.title('Environmental Index as a Function of Abiotic Resources', fontsize=16)
-plt.xlabel('Abiotic Resources', fontsize=14)
-plt.ylabel('Environmental Index', fontsize=14)
-plt.tight_layout()
-st.pyplot(fig4)
+def abiotic_scatter(data_filtered):
+    fig4 = plt.figure(figsize=(14, 10))
+    data_filtered2 = data_filtered[data_filtered['Abiotic Resources'] >= 0.98]
+    sns.scatterplot(x='Abiotic Resources', y='Environmental Index', data=data_filtered2, alpha = 0.7, s=100)
+    plt.title('Environmental Index as a Function of Abiotic Resources', fontsize=16)
+    plt.xlabel('Abiotic Resources', fontsize=14)
+    plt.ylabel('Environmental Index', fontsize=14)
+    plt.tight_layout()
+    return fig4
 
-#New data visualization for company breakdown into causes:
+show_figure('common_industries', abiotic_scatter)
 
-file_path_market_cap = '../data/cleaned_market_cap_values.csv'
-data_market_cap = pd.read_csv(file_path_market_cap)
+#New data visualization for company breakdown into causes:
 
 def plot1(data_market_cap):
     labels = ['Weapons Free Funds: Nuclear weapons screen',
@@ -178,52 +196,37 @@ def plot4(data_market_cap):
     ax.set_xticklabels(bar_labels, rotation=45, ha='right')
     return fig
 
-# Load data
-clean_market_dataset = '../data/cleaned_market_cap_values.csv'
-data_market_cap = pd.read_csv(clean_market_dataset)
-
 # Display the plots in Streamlit
 st.header("Analysis of Companies with Ethical Concerns")
 
 st.subheader("Companies Providing Weapons & Military Support")
-fig1 = plot1(data_market_cap)
-st.pyplot(fig1)
+show_figure('market_cap', plot1)
 
 st.subheader("Companies with Dependencies on Non-Renewable Energy")
-fig2 = plot2(data_market_cap)
-st.pyplot(fig2)
+show_figure('market_cap', plot2)
 
 st.subheader("Companies with Deforestation Supporting Operations")
-fig3 = plot3(data_market_cap)
-st.pyplot(fig3)
+show_figure('market_cap', plot3)
 
 st.subheader("Retailers of Consumer Goods Related to Deforestation")
-fig4 = plot4(data_market_cap)
-st.pyplot(fig4)
+show_figure('market_cap', plot4)
 
-# Function to generate 2D PCA plot
-def plot_2d_pca(features_for_pca, cluster_labels):
-    pca_2d = PCA(n_components=2)
-    X_pca_2d = pca_2d.fit_transform(features_for_pca)
-
-    plt.figure(figsize=(10, 8))
-    plt.scatter(X_pca_2d[:, 0], X_pca_2d[:, 1], c=cluster_labels, cmap='viridis', marker='o', alpha=0.7, edgecolor='k')
+# PCA projections are fitted once, in the pca_projection pipeline stage
+def plot_2d_pca(projection):
+    fig = plt.figure(figsize=(10, 8))
+    plt.scatter(projection['PC1'], projection['PC2'], c=projection['Cluster_Labels'], cmap='viridis', marker='o', alpha=0.7, edgecolor='k')
     plt.title('Clusters Visualized in PCA-Reduced 2D Space')
     plt.xlabel('Principal Component 1')
     plt.ylabel('Principal Component 2')
     plt.colorbar(label='Cluster Label')
-    st.pyplot()
-
-# Function to generate 3D PCA plot
-def plot_3d_pca(features_for_pca, cluster_labels):
-    pca_3d = PCA(n_components=3)
-    X_pca_3d = pca_3d.fit_transform(features_for_pca)
+    return fig
 
+def plot_3d_pca(projection):
     fig = plt.figure(figsize=(12, 10))
     ax = fig.add_subplot(111, projection='3d')
 
-    scatter = ax.scatter(X_pca_3d[:, 0], X_pca_3d[:, 1], X_pca_3d[:, 2], 
-                         c=cluster_labels, cmap='viridis', marker='o', alpha=0.7, edgecolor='k')
+    scatter = ax.scatter(projection['PC1'], projection['PC2'], projection['PC3'],
+                         c=projection['Cluster_Labels'], cmap='viridis', marker='o', alpha=0.7, edgecolor='k')
 
     ax.set_title('Clusters Visualized in PCA-Reduced 3D Space')
     ax.set_xlabel('Principal Component 1')
@@ -232,17 +235,11 @@ def plot_3d_pca(features_for_pca, cluster_labels):
 
     cbar = plt.colorbar(scatter, ax=ax, pad=0.1)
     cbar.set_label('Cluster Label')
-
-    st.pyplot()
+    return fig
 
 st.title('Clustering Analysis with PCA Visualization')
 
-# Read data
-clean_df = pd.read_csv('../Clustering-Hierarcal/clusters_added_clean_data_revised.csv')
-features_for_pca = clean_df.drop(columns=['Cluster_Labels', 'Company_Name', 'Ticker', 'Company_Name_Encoded', 'Industry_Encoded'])
-cluster_labels = clean_df['Cluster_Labels']
-
 st.header('2D PCA Visualization')
-plot_2d_pca(features_for_pca, cluster_labels)
+show_figure('pca_projection', plot_2d_pca)
 st.header('3D PCA Visualization')
-plot_3d_pca(features_for_pca, cluster_labels)
\ No newline at end of file
+show_figure('pca_projection', plot_3d_pca)
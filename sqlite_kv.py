@@ -0,0 +1,205 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+
+from nano_graphrag.base import BaseKVStorage
+
+DEFAULT_OPTIONS = {
+    "compress_min_bytes": 512,  # Values at least this large are zlib-compressed
+    # Size/age limits per namespace; only the ever-growing LLM cache is evicted
+    "limits": {"llm_response_cache": {"max_entries": 50000, "max_age_days": 90}},
+}
+
+
+@dataclass
+class SQLiteKVStorage(BaseKVStorage):
+    """Key-value storage backed by one SQLite file in the working directory.
+
+    Lookups hit the primary-key index instead of a JSON file loaded into
+    memory, and writes only touch the rows that changed. On first use a
+    namespace imports its old kv_store_{namespace}.json if one exists.
+    Options are read from addon_params["sqlite_kv"].
+    """
+
+    def __post_init__(self):
+        working_dir = self.global_config["working_dir"]
+        options = self.global_config.get("addon_params", {}).get("sqlite_kv", {})
+        self._options = {**DEFAULT_OPTIONS, **options}
+        self._limits = self._options["limits"].get(self.namespace, {})
+        # Namespaces share the connection, so they share its lock too
+        self._conn, self._lock = connect(os.path.join(working_dir, "kv_store.sqlite"))
+        json_file = os.path.join(working_dir, f"kv_store_{self.namespace}.json")
+        if os.path.exists(json_file) and not self._count():
+            self.import_json(json_file)
+
+    def import_json(self, json_file):
+        with open(json_file) as f:
+            data = json.load(f)
+        self._write(data)
+        with self._lock:
+            self._conn.commit()
+        return len(data)
+
+    def _count(self):
+        with self._lock:
+            (count,) = self._conn.execute(
+                "SELECT COUNT(*) FROM kv WHERE namespace = ?", (self.namespace,)
+            ).fetchone()
+        return count
+
+    def _encode(self, value):
+        raw = json.dumps(value, ensure_ascii=False).encode()
+        if len(raw) >= self._options["compress_min_bytes"]:
+            return zlib.compress(raw), 1
+        return raw, 0
+
+    @staticmethod
+    def _decode(blob, compressed):
+        if compressed:
+            blob = zlib.decompress(blob)
+        return json.loads(blob)
+
+    def _write(self, data):
+        now = time.time()
+        rows = []
+        for key, value in data.items():
+            blob, compressed = self._encode(value)
+            rows.append((self.namespace, key, blob, compressed, now))
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO kv (namespace, id, value, compressed, created)"
+                " VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    async def all_keys(self) -> list[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM kv WHERE namespace = ?", (self.namespace,)
+            ).fetchall()
+        return [key for (key,) in rows]
+
+    async def get_by_id(self, id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, compressed FROM kv WHERE namespace = ? AND id = ?",
+                (self.namespace, id),
+            ).fetchone()
+        return None if row is None else self._decode(*row)
+
+    async def get_by_ids(self, ids, fields=None):
+        found = {}
+        with self._lock:
+            for start in range(0, len(ids), 500):  # Stay under SQLite's variable limit
+                batch = ids[start : start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT id, value, compressed FROM kv WHERE namespace = ?"
+                    f" AND id IN ({placeholders})",
+                    (self.namespace, *batch),
+                ).fetchall()
+                found.update((key, (value, compressed)) for key, value, compressed in rows)
+        results = []
+        for id in ids:
+            if id not in found:
+                results.append(None)
+                continue
+            value = self._decode(*found[id])
+            if fields is not None:
+                value = {k: v for k, v in value.items() if k in fields}
+            results.append(value)
+        return results
+
+    async def filter_keys(self, data: list[str]) -> set[str]:
+        existing = set()
+        with self._lock:
+            for start in range(0, len(data), 500):
+                batch = data[start : start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT id FROM kv WHERE namespace = ? AND id IN ({placeholders})",
+                    (self.namespace, *batch),
+                ).fetchall()
+                existing.update(key for (key,) in rows)
+        return set(key for key in data if key not in existing)
+
+    async def upsert(self, data):
+        self._write(data)
+
+    async def drop(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM kv WHERE namespace = ?", (self.namespace,))
+            self._conn.commit()
+
+    async def index_done_callback(self):
+        with self._lock:
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        max_age_days = self._limits.get("max_age_days")
+        if max_age_days:
+            self._conn.execute(
+                "DELETE FROM kv WHERE namespace = ? AND created < ?",
+                (self.namespace, time.time() - max_age_days * 86400),
+            )
+        max_entries = self._limits.get("max_entries")
+        if max_entries:
+            # Drop the oldest rows beyond the limit
+            self._conn.execute(
+                "DELETE FROM kv WHERE namespace = ? AND id IN ("
+                " SELECT id FROM kv WHERE namespace = ?"
+                " ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                (self.namespace, self.namespace, max_entries),
+            )
+
+
+_connections = {}
+_connections_lock = threading.Lock()
+
+
+def connect(db_path):
+    """Returns the shared (connection, lock) for db_path, creating the schema on first use.
+
+    Every use of the connection, from any namespace, must hold the lock.
+    """
+    with _connections_lock:
+        if db_path in _connections:
+            return _connections[db_path]
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")  # Writes append to the log
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            " namespace TEXT NOT NULL, id TEXT NOT NULL, value BLOB NOT NULL,"
+            " compressed INTEGER NOT NULL, created REAL NOT NULL,"
+            " PRIMARY KEY (namespace, id)) WITHOUT ROWID"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS kv_created ON kv (namespace, created)")
+        _connections[db_path] = (conn, threading.Lock())
+        return _connections[db_path]
+
+
+def migrate(working_dir):
+    """Copies every kv_store_*.json in working_dir into kv_store.sqlite.
+
+    Namespaces that already have rows are left alone.
+    """
+    global_config = {"working_dir": working_dir, "addon_params": {}}
+    for file_name in sorted(os.listdir(working_dir)):
+        if not (file_name.startswith("kv_store_") and file_name.endswith(".json")):
+            continue
+        namespace = file_name[len("kv_store_") : -len(".json")]
+        # Constructing the storage imports the JSON file if the namespace is empty
+        storage = SQLiteKVStorage(namespace=namespace, global_config=global_config)
+        print(f"{file_name}: {storage._count()} entries in kv_store.sqlite")
+
+
+if __name__ == "__main__":
+    # Usage: python sqlite_kv.py [working_dir]
+    migrate(sys.argv[1] if len(sys.argv) > 1 else "./mohs")
@@ -0,0 +1,259 @@
+import glob
+import hashlib
+import json
+import os
+import re
+import time
+
+SEGMENT_SECONDS = 20  # Length of each transcript_{n}.json segment
+LITA_TIMESTAMP = re.compile(r"^\s*(\d+(?:\.\d+)?)s-(\d+(?:\.\d+)?)s\s*$")
+
+
+def content_hash(text):
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+def format_turn(start, end, text):
+    """Formats a turn like the LITA chunks ("0.0s-69.58s" line, then the text)."""
+    return f"{start:.2f}s-{end:.2f}s \n{text} \n"
+
+
+def parse_transcribe_json(data, offset=0.0):
+    """Extracts speaker turns from an AWS Transcribe result, with times shifted by offset.
+
+    Only the words and speaker labels are kept; the per-word alternatives and
+    confidence scores that make up most of the JSON never reach the graph.
+    """
+    results = data.get("results", {})
+    turns = []
+    speaker, words, start, end = None, [], None, None
+    for item in results.get("items", []):
+        content = item["alternatives"][0]["content"]
+        if item["type"] == "punctuation":
+            if words:
+                words[-1] += content
+            continue
+        label = item.get("speaker_label", "spk_0")
+        if label != speaker and words:
+            turns.append(format_turn(start, end, f"{speaker}: {' '.join(words)}"))
+            words = []
+        if not words:
+            speaker, start = label, offset + float(item["start_time"])
+        words.append(content)
+        end = offset + float(item["end_time"])
+    if words:
+        turns.append(format_turn(start, end, f"{speaker}: {' '.join(words)}"))
+
+    if not turns:
+        transcript = " ".join(t["transcript"] for t in results.get("transcripts", []))
+        if transcript.strip():
+            turns.append(format_turn(offset, offset + SEGMENT_SECONDS, transcript))
+    return "".join(turns)
+
+
+def split_lita_transcript(text):
+    """Splits the LITA transcript into its timestamped entries."""
+    entries, current = [], []
+    for line in text.splitlines():
+        if LITA_TIMESTAMP.match(line) and current:
+            entries.append("\n".join(current) + "\n")
+            current = []
+        if line.strip():
+            current.append(line)
+    if current:
+        entries.append("\n".join(current) + "\n")
+    return entries
+
+
+def squash(text):
+    return " ".join(text.split())
+
+
+class TranscriptIngestor:
+    """Inserts new transcript segments into the GraphRAG store as they show up.
+
+    Every inserted chunk is recorded by content hash in a ledger inside the
+    GraphRAG working directory, so restarts skip what is already in the graph.
+    Without a ledger, it is seeded from the graph's existing full_docs, so
+    transcripts inserted before the ledger existed (as raw Transcribe JSON or
+    the whole LITA file) are not extracted a second time.
+    """
+
+    def __init__(
+        self,
+        graph_func,
+        transcript_dir="transcripts",
+        lita_path="transcripts/lita_transcript.txt",
+        vis_dir=None,
+    ):
+        self.graph_func = graph_func
+        self.transcript_dir = transcript_dir
+        self.lita_path = lita_path
+        self.vis_dir = vis_dir
+        self.ledger_path = os.path.join(
+            graph_func.working_dir, "ingested_transcripts.json"
+        )
+        self.ledger = {}
+        if os.path.exists(self.ledger_path):
+            with open(self.ledger_path) as f:
+                self.ledger = json.load(f)
+        else:
+            self.seed_ledger()
+        self.latencies = []  # (source, seconds, audio seconds or None) per insert
+
+    def _existing_docs(self):
+        from nano_graphrag._utils import always_get_an_event_loop
+
+        async def read():
+            full_docs = self.graph_func.full_docs
+            docs = await full_docs.get_by_ids(await full_docs.all_keys())
+            return [doc["content"] for doc in docs if doc]
+
+        return always_get_an_event_loop().run_until_complete(read())
+
+    def seed_ledger(self):
+        """Records the transcripts that are already in full_docs; returns how many."""
+        job_names, texts = set(), []
+        for content in self._existing_docs():
+            try:
+                job_names.add(json.loads(content)["jobName"])
+            except (ValueError, TypeError, KeyError):
+                texts.append(squash(content))
+        seeded = {}
+        for idx, path in self.segment_files():
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+            if data.get("jobName") in job_names:
+                text = parse_transcribe_json(data, offset=idx * SEGMENT_SECONDS)
+                seeded[content_hash(text)] = {"source": path, "ingested_at": None}
+        if self.lita_path and os.path.exists(self.lita_path):
+            with open(self.lita_path) as f:
+                entries = split_lita_transcript(f.read())
+            for entry in entries:
+                if any(squash(entry) in text for text in texts):
+                    seeded[content_hash(entry)] = {
+                        "source": self.lita_path,
+                        "ingested_at": None,
+                    }
+        self.ledger.update(seeded)
+        self._save_ledger()
+        print(f"Seeded the transcript ledger with {len(seeded)} existing entries")
+        return len(seeded)
+
+    def _save_ledger(self):
+        tmp_path = self.ledger_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.ledger, f, indent=2)
+        os.replace(tmp_path, self.ledger_path)
+
+    def _insert(self, source, text, vis_name=None, audio_seconds=None):
+        key = content_hash(text)
+        if not text.strip() or key in self.ledger:
+            return False
+        start = time.perf_counter()
+        self.graph_func.insert(text)
+        latency = time.perf_counter() - start
+        self.latencies.append((source, latency, audio_seconds))
+        self.ledger[key] = {"source": source, "ingested_at": time.time()}
+        self._save_ledger()
+        if audio_seconds:
+            print(
+                f"Ingested {source} in {latency:.1f}s "
+                f"({latency / audio_seconds:.2f}x real time)"
+            )
+        else:
+            print(f"Ingested {source} in {latency:.1f}s")
+        if self.vis_dir and vis_name:
+            from neo4j_vis import visualize_in_background
+
+            # Rendered off the ingest thread; skipped when the graph did not change
+            visualize_in_background(output_file=os.path.join(self.vis_dir, vis_name))
+        return True
+
+    def segment_files(self):
+        pattern = os.path.join(self.transcript_dir, "transcript_*.json")
+        indexed = []
+        for path in glob.glob(pattern):
+            match = re.search(r"transcript_(\d+)\.json$", path)
+            if match:
+                indexed.append((int(match.group(1)), path))
+        return sorted(indexed)
+
+    def poll(self):
+        """Ingests whatever is new since the last poll; returns the number of inserts."""
+        inserted = 0
+        if self.lita_path and os.path.exists(self.lita_path):
+            with open(self.lita_path) as f:
+                entries = split_lita_transcript(f.read())
+            new_entries = [e for e in entries if content_hash(e) not in self.ledger]
+            # Insert only the new entries, as one chunk, but record each entry
+            if new_entries and self._insert(
+                self.lita_path, "".join(new_entries), "base_graph.html"
+            ):
+                for entry in new_entries:
+                    self.ledger[content_hash(entry)] = {
+                        "source": self.lita_path,
+                        "ingested_at": time.time(),
+                    }
+                self._save_ledger()
+                inserted += 1
+
+        for idx, path in self.segment_files():
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue  # Still being written; pick it up on the next poll
+            text = parse_transcribe_json(data, offset=idx * SEGMENT_SECONDS)
+            if self._insert(path, text, f"transcript_{idx}.html", SEGMENT_SECONDS):
+                inserted += 1
+        return inserted
+
+    def stats(self):
+        if not self.latencies:
+            return {"inserts": 0}
+        seconds = [latency for _, latency, _ in self.latencies]
+        stats = {
+            "inserts": len(seconds),
+            "mean_latency_s": round(sum(seconds) / len(seconds), 2),
+            "max_latency_s": round(max(seconds), 2),
+        }
+        # Only live segments have a real-time budget; the LITA backfill doesn't
+        ratios = [latency / audio for _, latency, audio in self.latencies if audio]
+        if ratios:
+            stats["keeping_up"] = max(ratios) < 1
+        return stats
+
+    def run_forever(self, interval=2):
+        while True:
+            self.poll()
+            time.sleep(interval)
+
+
+if __name__ == "__main__":
+    from nano_graphrag import GraphRAG
+    from neo4j_vis import StampedNeo4jStorage
+    from sqlite_kv import SQLiteKVStorage
+    from mmap_vdb import MmapVectorStorage
+    from embedding_cache import graphrag_embedding
+
+    neo4j_config = {
+        "neo4j_url": os.environ.get("NEO4J_URL", "neo4j://localhost:7687"),
+        "neo4j_auth": (
+            os.environ.get("NEO4J_USER", "neo4j"),
+            os.environ.get("NEO4J_PASSWORD", "12345678"),
+        ),
+    }
+    graph_func = GraphRAG(
+        graph_storage_cls=StampedNeo4jStorage,
+        key_string_value_json_storage_cls=SQLiteKVStorage,
+        vector_db_storage_cls=MmapVectorStorage,
+        embedding_func=graphrag_embedding("./mohs"),
+        embedding_batch_num=256,
+        addon_params=neo4j_config,
+        working_dir="./mohs",
+    )
+    TranscriptIngestor(graph_func, vis_dir="three_js").run_forever()
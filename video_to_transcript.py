@@ -2,108 +2,235 @@ import boto3
 import time
 import json
 import os
-from moviepy.editor import VideoFileClip
-from pydub import AudioSegment
+import io
+import random
+import subprocess
+import threading
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from moviepy.config import get_setting
+
+SAMPLE_RATE = 16000  # Hz, mono 16-bit PCM is plenty for speech and keeps segments small
+
+
+def with_retries(func, *args, attempts=4, base_delay=1.0, **kwargs):
+    """Calls func, retrying with exponential backoff and jitter when it raises."""
+    for attempt in range(attempts):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if attempt == attempts - 1:
+                raise
+            delay = base_delay * 2**attempt * (0.5 + random.random())
+            print(f"{getattr(func, '__name__', func)} failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def stream_audio_segments(mp4_file_path, segment_duration=20, sample_rate=SAMPLE_RATE):
+    """Decodes the audio track with ffmpeg and yields in-memory WAV segments as they arrive.
+
+    Only one segment of raw PCM is held at a time, so memory does not grow with
+    the length of the recording.
+    """
+    segment_bytes = segment_duration * sample_rate * 2  # 16-bit mono
+    command = [
+        get_setting("FFMPEG_BINARY"),
+        "-nostdin",
+        "-loglevel", "error",
+        "-i", mp4_file_path,
+        "-vn",
+        "-ac", "1",
+        "-ar", str(sample_rate),
+        "-f", "s16le",
+        "-",
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE)
+    finished = False
+    try:
+        while True:
+            pcm = process.stdout.read(segment_bytes)
+            if not pcm:
+                finished = True
+                break
+            buffer = io.BytesIO()
+            with wave.open(buffer, "wb") as wav:
+                wav.setnchannels(1)
+                wav.setsampwidth(2)
+                wav.setframerate(sample_rate)
+                wav.writeframes(pcm)
+            yield buffer
+    finally:
+        process.stdout.close()
+        process.wait()
+    # Only checked when ffmpeg reached the end; a consumer closing early makes it exit non-zero too
+    if finished and process.returncode != 0:
+        raise RuntimeError(
+            f"ffmpeg exited with code {process.returncode} while decoding {mp4_file_path}"
+        )
 
 
-def transcribe_mp4_in_segments(
-    mp4_file_path, bucket_name, segment_duration=20, output_folder="transcripts"
-):
-    # Step 1: Extract Audio from MP4
-    video = VideoFileClip(mp4_file_path)
-    audio_file_path = "extracted_audio.wav"
-    video.audio.write_audiofile(audio_file_path)
-
-    # Step 2: Split the extracted audio into 20-second segments
-    audio = AudioSegment.from_file(audio_file_path)
-    segment_duration_ms = segment_duration * 1000  # Convert seconds to milliseconds
-    total_segments = len(audio) // segment_duration_ms + (
-        1 if len(audio) % segment_duration_ms != 0 else 0
-    )
+def upload_segment(s3_client, buffer, bucket_name, s3_key):
+    buffer.seek(0)  # Rewind so a retried upload sends the whole segment again
+    s3_client.upload_fileobj(buffer, bucket_name, s3_key)
 
-    # Ensure the output folder exists
-    os.makedirs(output_folder, exist_ok=True)
 
-    # Initialize AWS clients
-    s3_client = boto3.client("s3")
-    transcribe_client = boto3.client("transcribe")
-
-    for idx in range(total_segments):
-        # Start time for the segment in milliseconds
-        start_ms = idx * segment_duration_ms
-        end_ms = min((idx + 1) * segment_duration_ms, len(audio))
-        segment = audio[start_ms:end_ms]
-
-        segment_file_name = f"segment_{idx}.wav"
-        segment_file_path = os.path.join(output_folder, segment_file_name)
-        segment.export(
-            segment_file_path, format="wav"
-        )  # AWS Transcribe supports WAV format
-
-        # Upload the segment to S3
-        s3_key = f"audio_segments/{segment_file_name}"
-        s3_client.upload_file(segment_file_path, bucket_name, s3_key)
-
-        # Start a transcription job
-        job_name = f"transcription_job_{int(time.time())}_{idx}"
-        media_uri = f"s3://{bucket_name}/{s3_key}"
-
-        transcribe_client.start_transcription_job(
-            TranscriptionJobName=job_name,
-            Media={"MediaFileUri": media_uri},
-            MediaFormat="wav",
-            LanguageCode="en-US",  # Change as per your audio language
-            Settings={
-                "ShowSpeakerLabels": True,
-                "MaxSpeakerLabels": 2,  # Adjust based on expected number of speakers
-            },
-            OutputBucketName=bucket_name,
-            OutputKey=f"transcripts/{job_name}.json",
+def wait_for_job(transcribe_client, job_name, poll_interval=5, first_poll=1):
+    """Polls a transcription job, backing off from first_poll up to poll_interval seconds."""
+    delay = first_poll
+    while True:
+        status = with_retries(
+            transcribe_client.get_transcription_job, TranscriptionJobName=job_name
         )
-
-        # Wait for the transcription job to complete
-        print(f"Waiting for transcription job {job_name} to complete...")
-        while True:
-            status = transcribe_client.get_transcription_job(
-                TranscriptionJobName=job_name
+        job_status = status["TranscriptionJob"]["TranscriptionJobStatus"]
+        if job_status in ["COMPLETED", "FAILED"]:
+            return job_status
+        time.sleep(delay)
+        delay = min(delay * 2, poll_interval)
+
+
+def transcribe_segment(
+    idx,
+    segment,
+    bucket_name,
+    s3_client,
+    transcribe_client,
+    poll_interval=5,
+    max_attempts=3,
+):
+    """Uploads and transcribes one in-memory WAV segment, returning the transcript bytes or None."""
+    # Upload the segment to S3 straight from memory
+    s3_key = f"audio_segments/segment_{idx}.wav"
+    with_retries(upload_segment, s3_client, segment, bucket_name, s3_key)
+    segment.close()
+
+    transcript = None
+    try:
+        for attempt in range(max_attempts):
+            # Start a transcription job
+            job_name = f"transcription_job_{int(time.time())}_{idx}_{attempt}"
+            media_uri = f"s3://{bucket_name}/{s3_key}"
+            output_key = f"transcripts/{job_name}.json"
+
+            with_retries(
+                transcribe_client.start_transcription_job,
+                TranscriptionJobName=job_name,
+                Media={"MediaFileUri": media_uri},
+                MediaFormat="wav",
+                LanguageCode="en-US",  # Change as per your audio language
+                Settings={
+                    "ShowSpeakerLabels": True,
+                    "MaxSpeakerLabels": 2,  # Adjust based on expected number of speakers
+                },
+                OutputBucketName=bucket_name,
+                OutputKey=output_key,
             )
-            job_status = status["TranscriptionJob"]["TranscriptionJobStatus"]
-            if job_status in ["COMPLETED", "FAILED"]:
+
+            # Wait for the transcription job to complete
+            print(f"Waiting for transcription job {job_name} to complete...")
+            job_status = wait_for_job(transcribe_client, job_name, poll_interval)
+
+            if job_status == "COMPLETED":
+                # Download the transcription result from S3
+                response = with_retries(
+                    s3_client.get_object, Bucket=bucket_name, Key=output_key
+                )
+                transcript = response["Body"].read()
+
+            # Delete the transcription job (optional); failing here shouldn't lose the transcript
+            try:
+                with_retries(
+                    transcribe_client.delete_transcription_job,
+                    TranscriptionJobName=job_name,
+                )
+            except Exception as e:
+                print(f"Could not delete transcription job {job_name}: {e}")
+
+            if transcript is not None:
                 break
-            time.sleep(5)
+            print(f"Transcription job {job_name} failed.")
+    finally:
+        # Clean up: Delete the audio segment from S3; as above, failing here shouldn't lose the transcript
+        try:
+            with_retries(s3_client.delete_object, Bucket=bucket_name, Key=s3_key)
+        except Exception as e:
+            print(f"Could not delete audio segment {s3_key}: {e}")
 
-        if job_status == "COMPLETED":
-            # Download the transcription result from S3
-            transcript_file_name = f"transcript_{idx}.json"
-            transcript_file_path = os.path.join(output_folder, transcript_file_name)
+    return transcript
 
-            # Download the transcript file
-            s3_client.download_file(
-                bucket_name, f"transcripts/{job_name}.json", transcript_file_path
-            )
 
-            print(f"Transcription for segment {idx} saved to {transcript_file_path}")
-        else:
-            print(f"Transcription job {job_name} failed.")
+def transcribe_mp4_in_segments(
+    mp4_file_path,
+    bucket_name,
+    segment_duration=20,
+    output_folder="transcripts",
+    max_parallel=4,
+    s3_client=None,
+    transcribe_client=None,
+    poll_interval=5,
+):
+    """Transcribes an MP4 in fixed-length segments, up to max_parallel segments at a time.
 
-        # Clean up: Delete the audio segment from S3 and local storage
-        s3_client.delete_object(Bucket=bucket_name, Key=s3_key)
-        os.remove(segment_file_path)
+    Audio is decoded as a stream and each segment is uploaded from memory while
+    the next one is decoded, so at most max_parallel + 1 segments are held at
+    once. Transcripts are still written as transcript_{idx}.json in segment
+    order. Clients can be injected (e.g. moto or a local stand-in) for offline runs.
+    """
+    # Ensure the output folder exists
+    os.makedirs(output_folder, exist_ok=True)
 
-        # Delete the transcription job (optional)
-        transcribe_client.delete_transcription_job(TranscriptionJobName=job_name)
+    # Initialize AWS clients
+    s3_client = s3_client or boto3.client("s3")
+    transcribe_client = transcribe_client or boto3.client("transcribe")
+
+    def write_transcript(idx, future):
+        try:
+            transcript = future.result()
+        except Exception as e:
+            print(f"Transcription for segment {idx} failed: {e}")
+            return
+        if transcript is None:
+            return
+        transcript_file_path = os.path.join(output_folder, f"transcript_{idx}.json")
+        with open(transcript_file_path, "wb") as f:
+            f.write(transcript)
+        print(f"Transcription for segment {idx} saved to {transcript_file_path}")
+
+    # One slot per segment inside the workers; plus the segment being decoded,
+    # at most max_parallel + 1 are held
+    slots = threading.BoundedSemaphore(max_parallel)
+    futures = []
+    written = 0
+
+    with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+        segments = stream_audio_segments(mp4_file_path, segment_duration)
+        for idx, segment in enumerate(segments):
+            # Acquire before submitting, so a job that finishes at once can't release first
+            slots.acquire()
+            future = executor.submit(
+                transcribe_segment,
+                idx,
+                segment,
+                bucket_name,
+                s3_client,
+                transcribe_client,
+                poll_interval,
+            )
+            future.add_done_callback(lambda _: slots.release())
+            futures.append(future)
 
-        # Wait for 20 seconds before processing the next segment (optional)
-        # Uncomment the next line if you want to simulate processing every 20 seconds
-        # time.sleep(20)
+            # Write finished transcripts in segment order as they become available
+            while written < len(futures) and futures[written].done():
+                write_transcript(written, futures[written])
+                written += 1
 
-    # Clean up: Delete the extracted audio file
-    os.remove(audio_file_path)
+        for idx in range(written, len(futures)):
+            write_transcript(idx, futures[idx])
 
 
-# Example usage
-mp4_file = "mohs.mp4"
-bucket_name = "hackgt"
-output_folder = "transcripts"
+if __name__ == "__main__":
+    # Example usage
+    mp4_file = "mohs.mp4"
+    bucket_name = "hackgt"
+    output_folder = "transcripts"
 
-transcribe_mp4_in_segments(mp4_file, bucket_name, output_folder=output_folder)
+    transcribe_mp4_in_segments(mp4_file, bucket_name, output_folder=output_folder)
@@ -0,0 +1,168 @@
+import asyncio
+import re
+
+from nano_graphrag import QueryParam
+from nano_graphrag.prompt import GRAPH_FIELD_SEP, PROMPTS
+from nano_graphrag._utils import always_get_an_event_loop, list_of_list_to_csv
+
+TIMESTAMP = re.compile(r"(\d+(?:\.\d+)?)s-(\d+(?:\.\d+)?)s")
+
+
+class TimelineIndex:
+    """Maps text chunks to the time ranges named by their "0.0s-69.58s" timestamps."""
+
+    def __init__(self, graph_func):
+        self.graph_func = graph_func
+        self.ranges = {}  # chunk id -> (start, end) covered by its timestamps
+        self.contents = {}
+        self.entities = {}  # chunk id -> names of the entities extracted from it
+
+    async def refresh(self):
+        """Indexes chunks inserted since the last refresh."""
+        keys = await self.graph_func.text_chunks.all_keys()
+        new_keys = [k for k in keys if k not in self.ranges]
+        if not new_keys:
+            return
+        chunks = await self.graph_func.text_chunks.get_by_ids(new_keys)
+        for key, chunk in zip(new_keys, chunks):
+            stamps = [
+                (float(s), float(e)) for s, e in TIMESTAMP.findall(chunk["content"])
+            ]
+            if stamps:
+                self.ranges[key] = (min(s for s, _ in stamps), max(e for _, e in stamps))
+                self.contents[key] = chunk["content"]
+            else:
+                self.ranges[key] = None  # Untimed chunk, never in a window
+
+        # A chunk's entities are all upserted before the chunk itself, and later
+        # merges only append to source_id, so each chunk is looked up once
+        timed = {key for key in new_keys if self.ranges[key] is not None}
+        for key in timed:
+            self.entities[key] = set()
+        graph = self.graph_func.chunk_entity_relation_graph
+        for name, source_id in await _nodes_from_chunks(graph, timed):
+            for chunk_id in source_id.split(GRAPH_FIELD_SEP):
+                if chunk_id in timed:
+                    self.entities[chunk_id].add(name)
+
+    def chunks_between(self, start, end):
+        return {
+            key
+            for key, span in self.ranges.items()
+            if span is not None and span[0] < end and span[1] > start
+        }
+
+
+async def _nodes_from_chunks(graph, chunk_ids):
+    """(name, source_id) of every graph node extracted from any of chunk_ids."""
+    if not chunk_ids:
+        return []
+    if hasattr(graph, "nodes_from_chunks"):
+        return await graph.nodes_from_chunks(chunk_ids)
+    # NetworkXStorage keeps the whole graph in memory
+    return [
+        (name, data.get("source_id", ""))
+        for name, data in graph._graph.nodes(data=True)
+        if _in_window(data.get("source_id", ""), chunk_ids)
+    ]
+
+
+def _in_window(source_id, chunk_ids):
+    return any(c in chunk_ids for c in source_id.split(GRAPH_FIELD_SEP))
+
+
+async def _window_context(graph_func, timeline, chunk_ids, top_k):
+    graph = graph_func.chunk_entity_relation_graph
+    # Candidates come from the window itself, ranked by how many of its chunks
+    # mention them and then by degree, as local search ranks entities
+    hits = {}
+    for key in chunk_ids:
+        for name in timeline.entities.get(key, ()):
+            hits[name] = hits.get(name, 0) + 1
+    names = list(hits)
+    nodes = await asyncio.gather(*(graph.get_node(name) for name in names))
+    degrees = await asyncio.gather(*(graph.node_degree(name) for name in names))
+    ranked = sorted(
+        (
+            (hits[name], degree or 0, name, node)
+            for name, node, degree in zip(names, nodes, degrees)
+            if node is not None
+        ),
+        key=lambda row: row[:2],
+        reverse=True,
+    )
+    entities = [(name, node) for _, _, name, node in ranked[:top_k]]
+
+    relations, seen_edges = [], set()
+    for name, _ in entities:
+        for src, tgt in await graph.get_node_edges(name) or []:
+            if (src, tgt) in seen_edges or (tgt, src) in seen_edges:
+                continue
+            seen_edges.add((src, tgt))
+            edge = await graph.get_edge(src, tgt)
+            if edge is not None and _in_window(edge.get("source_id", ""), chunk_ids):
+                relations.append((src, tgt, edge))
+
+    entity_rows = [["id", "entity", "type", "description"]] + [
+        [i, name, node.get("entity_type", "UNKNOWN"), node.get("description", "")]
+        for i, (name, node) in enumerate(entities)
+    ]
+    relation_rows = [["id", "source", "target", "description", "weight"]] + [
+        [i, src, tgt, edge.get("description", ""), edge.get("weight", 1)]
+        for i, (src, tgt, edge) in enumerate(relations)
+    ]
+    source_rows = [["id", "content"]] + [
+        [i, timeline.contents[key]] for i, key in enumerate(sorted(chunk_ids))
+    ]
+    return f"""
+-----Entities-----
+```csv
+{list_of_list_to_csv(entity_rows)}
+```
+-----Relationships-----
+```csv
+{list_of_list_to_csv(relation_rows)}
+```
+-----Sources-----
+```csv
+{list_of_list_to_csv(source_rows)}
+```
+"""
+
+
+async def awindowed_query(
+    graph_func, timeline, query, window, window_seconds=20, param=QueryParam(mode="local")
+):
+    """Answers ``query`` from the chunks and entities of the current and previous window.
+
+    Retrieval is scoped to chunks whose timestamps overlap
+    [(window - 1) * window_seconds, (window + 1) * window_seconds), so the prompt
+    only carries what changed recently instead of every community report.
+    """
+    if param.mode == "global":
+        return await graph_func.aquery(query, param)
+
+    await timeline.refresh()
+    start = max(window - 1, 0) * window_seconds
+    end = (window + 1) * window_seconds
+    chunk_ids = timeline.chunks_between(start, end)
+    if not chunk_ids:
+        return PROMPTS["fail_response"]
+
+    context = await _window_context(graph_func, timeline, chunk_ids, param.top_k)
+    if param.only_need_context:
+        return context
+    system_prompt = PROMPTS["local_rag_response"].format(
+        context_data=context, response_type=param.response_type
+    )
+    return await graph_func.best_model_func(query, system_prompt=system_prompt)
+
+
+def windowed_query(graph_func, timeline, query, window, window_seconds=20, mode="local"):
+    """Synchronous wrapper; pass mode="global" for an on-demand full global search."""
+    loop = always_get_an_event_loop()
+    return loop.run_until_complete(
+        awindowed_query(
+            graph_func, timeline, query, window, window_seconds, QueryParam(mode=mode)
+        )
+    )